@@ -1,17 +1,35 @@
 import streamlit as st
-import time
-from datetime import datetime
 import logging
-from utils.HFManager import fetch_training_metrics_commits
-import pandas as pd
+import time
+from utils.Instrumentation import instrumentation
 import os
 from dotenv import load_dotenv
-import plotly.graph_objects as go
-import pydeck as pdk
+# The metrics manager, pandas, plotly and pydeck are imported by the sections
+# using them, so the sections before paint without waiting for those imports
+
+# Start of this script run, for the session's time to first paint
+script_start = time.perf_counter()
 
 # Load environment variables
 load_dotenv()
 
+# How often each session checks for new data (seconds)
+REFRESH_SECONDS = 5
+
+# Token goal of a training job, shown by the progress bar
+TARGET_TOKENS = float(os.getenv("TARGET_TOKENS", "1e12"))
+
+# Maximum number of points sent to the browser per chart
+CHART_POINT_BUDGETS = {
+    'final_loss': 1000,
+    'perplexity': 1000,
+    'tokens_per_second': 1000,
+    'inner_lr': 500,
+}
+
+# Number of miners shown on the leaderboard
+LEADERBOARD_SIZE = 100
+
 # Configure logging
 logging.basicConfig(level=logging.INFO,
                     format='%(asctime)s - %(levelname)s - %(message)s')
@@ -45,85 +63,6 @@ st.markdown("""
     </style>
 """, unsafe_allow_html=True)
 
-class MetricsManager:
-    def __init__(self, repo_name, token):
-        if not repo_name:
-            raise ValueError("Repository name is required")
-        if not token:
-            raise ValueError("Hugging Face token is required")
-
-        self.repo_name = repo_name
-        self.token = token
-        self.last_update = None
-        self.metrics_cache = []
-        self.update_interval = 60  # seconds
-        logging.info(f"MetricsManager initialized for repo: {repo_name}")
-
-    def needs_update(self):
-        if not self.last_update:
-            return True
-        return (datetime.now() - self.last_update).total_seconds() > self.update_interval
-
-    def fetch_latest_metrics(self):
-        if self.needs_update():
-            logging.info("Fetching fresh metrics from HuggingFace...")
-            try:
-                self.metrics_cache = fetch_training_metrics_commits(self.repo_name, token=self.token)
-                self.last_update = datetime.now()
-                logging.info(f"Fetched {len(self.metrics_cache)} metrics entries")
-            except Exception as e:
-                logging.error(f"Error fetching metrics: {str(e)}")
-                return []
-        return self.metrics_cache
-
-    def get_latest_job_metrics(self):
-        metrics = self.fetch_latest_metrics()
-        if not metrics:
-            return None
-
-        # Group metrics by job_id
-        jobs = {}
-        for entry in metrics:
-            job_id = entry['metrics']['job_id']
-            if job_id not in jobs:
-                jobs[job_id] = []
-            jobs[job_id].append(entry)
-
-        # Get the latest job
-        latest_job_id = max(jobs.keys())
-        return jobs[latest_job_id]
-
-    def get_historical_metrics(self):
-        metrics = self.fetch_latest_metrics()
-        if not metrics:
-            return pd.DataFrame()
-
-        records = []
-        for entry in metrics:
-            record = {
-                'timestamp': entry['timestamp'],
-                'miner_uid': entry['miner_uid'],
-                'job_id': entry['metrics']['job_id'],
-                'final_loss': entry['metrics'].get('final_loss', None),
-                'perplexity': entry['metrics'].get('perplexity', None),
-                'tokens_per_second': entry['metrics'].get('tokens_per_second', None),
-                'inner_lr': entry['metrics'].get('inner_lr', None),
-                'location': entry.get('location', 'Unknown'),
-                'model_repo': entry['model_repo']
-            }
-            records.append(record)
-
-        df = pd.DataFrame(records)
-        try:
-            df['timestamp'] = pd.to_datetime(df['timestamp'], format='%Y%m%d_%H%M%S')
-        except ValueError:
-            try:
-                df['timestamp'] = pd.to_datetime(df['timestamp'], format='mixed')
-            except:
-                st.warning("Could not parse some timestamp values")
-
-        return df.sort_values('timestamp')
-
 # Get configuration
 try:
     hf_token = st.secrets["HF_TOKEN"]
@@ -139,18 +78,51 @@ if not hf_token:
     st.error("No Hugging Face token found. Please set HF_TOKEN in environment variables.")
     st.stop()
 
-# Initialize metrics manager
-if 'metrics_manager' not in st.session_state:
-    st.session_state.metrics_manager = MetricsManager(central_repo, hf_token)
-
 # Dashboard UI
 st.title("🧠 Alpha9 Training Dashboard")
 
+# Initialize metrics manager, shared by every session of this server process.
+# It serves the index snapshot of the previous run while ingestion catches up.
+@st.cache_resource(show_spinner="Loading metrics...")
+def get_metrics_manager(repo_name, token):
+    from utils.MetricsManager import MetricsManager
+    manager = MetricsManager(repo_name, token)
+    manager.start_background_refresh()
+    return manager
+
+metrics_manager = get_metrics_manager(central_repo, hf_token)
+render_start = time.perf_counter()
+
+# The data-bound sections below are only re-executed when the store's data
+# version moves past the one this session last rendered.
+@st.fragment(run_every=REFRESH_SECONDS)
+def refresh_status():
+    if metrics_manager.data_version != st.session_state.get('rendered_version'):
+        st.rerun(scope="app")
+
+    snapshot_age = metrics_manager.snapshot_age()
+    if snapshot_age is None:
+        st.caption("Waiting for the first metrics refresh...")
+    else:
+        st.caption(f"Metrics updated {snapshot_age:.0f}s ago")
+    if metrics_manager.last_error:
+        st.warning(f"Latest refresh failed, showing previous data: {metrics_manager.last_error}")
+
+st.session_state.rendered_version = metrics_manager.data_version
+refresh_status()
+
+# With several repositories monitored, the dashboard shows all of them or one
+selected_repo = None
+if len(metrics_manager.repo_names) > 1:
+    choice = st.sidebar.selectbox("Repository", ["All repositories", *metrics_manager.repo_names])
+    selected_repo = None if choice == "All repositories" else choice
+
 # Progress Bar Section
-latest_metrics = st.session_state.metrics_manager.get_latest_job_metrics()
-if latest_metrics:
-    progress = 0.7158  # This should be calculated from actual data
-    tokens_progress = "715,899,792,640/1T tokens"
+latest_metrics = metrics_manager.get_latest_job_metrics(repo=selected_repo)
+latest_job = metrics_manager.get_job_aggregate(repo=selected_repo)
+if latest_metrics and latest_job:
+    progress = min(latest_job.total_tokens / TARGET_TOKENS, 1.0)
+    tokens_progress = f"{latest_job.total_tokens:,.0f}/{TARGET_TOKENS:,.0f} tokens"
     
     st.markdown("### Training Progress")
     st.progress(progress)
@@ -160,19 +132,27 @@ if latest_metrics:
     with col2:
         st.metric("Tokens", tokens_progress)
 
+# Time to first paint: from a session's first script run until its first data is on screen
+if 'first_paint' not in st.session_state:
+    st.session_state.first_paint = time.perf_counter() - script_start
+    instrumentation.observe("first_paint", st.session_state.first_paint, frontend="streamlit")
+
 # Metrics Grid
+import plotly.graph_objects as go
+
 st.markdown("### Training Metrics")
 metric_cols = st.columns(2)
 with metric_cols[0]:
     # Loss Plot
+    loss_series = metrics_manager.get_job_trajectory('final_loss', CHART_POINT_BUDGETS['final_loss'], repo=selected_repo)
     fig_loss = go.Figure()
-    fig_loss.add_trace(go.Scatter(x=[1, 2, 3], y=[12, 3, 2], 
+    fig_loss.add_trace(go.Scatter(x=loss_series['timestamp'], y=loss_series['final_loss'], 
                                  mode='lines', 
                                  line=dict(color='#9146FF', width=2),
                                  name='Loss'))
     fig_loss.update_layout(
         title='Loss',
-        xaxis_title='Steps',
+        xaxis_title='Time',
         yaxis_title='Loss',
         yaxis_type="log",
         paper_bgcolor='rgba(0,0,0,0)',
@@ -182,8 +162,9 @@ with metric_cols[0]:
     st.plotly_chart(fig_loss, use_container_width=True)
 
     # Tokens per Second Plot
+    tps_series = metrics_manager.get_job_trajectory('tokens_per_second', CHART_POINT_BUDGETS['tokens_per_second'], repo=selected_repo)
     fig_tps = go.Figure()
-    fig_tps.add_trace(go.Scatter(x=[1, 2, 3], y=[40000, 42000, 41000], 
+    fig_tps.add_trace(go.Scatter(x=tps_series['timestamp'], y=tps_series['tokens_per_second'], 
                                 mode='lines', 
                                 line=dict(color='#9146FF', width=2),
                                 name='Tokens/s'))
@@ -199,14 +180,15 @@ with metric_cols[0]:
 
 with metric_cols[1]:
     # Perplexity Plot
+    perp_series = metrics_manager.get_job_trajectory('perplexity', CHART_POINT_BUDGETS['perplexity'], repo=selected_repo)
     fig_perp = go.Figure()
-    fig_perp.add_trace(go.Scatter(x=[1, 2, 3], y=[200, 50, 20], 
+    fig_perp.add_trace(go.Scatter(x=perp_series['timestamp'], y=perp_series['perplexity'], 
                                  mode='lines', 
                                  line=dict(color='#9146FF', width=2),
                                  name='Perplexity'))
     fig_perp.update_layout(
         title='Perplexity',
-        xaxis_title='Steps',
+        xaxis_title='Time',
         yaxis_title='Perplexity',
         yaxis_type="log",
         paper_bgcolor='rgba(0,0,0,0)',
@@ -216,14 +198,15 @@ with metric_cols[1]:
     st.plotly_chart(fig_perp, use_container_width=True)
 
     # Inner LR Plot
+    lr_series = metrics_manager.get_job_trajectory('inner_lr', CHART_POINT_BUDGETS['inner_lr'], repo=selected_repo)
     fig_lr = go.Figure()
-    fig_lr.add_trace(go.Scatter(x=[1, 2, 3], y=[0.0001, 0.0001, 0.0001], 
+    fig_lr.add_trace(go.Scatter(x=lr_series['timestamp'], y=lr_series['inner_lr'], 
                                mode='lines', 
                                line=dict(color='#9146FF', width=2),
                                name='Inner LR'))
     fig_lr.update_layout(
         title='Inner Learning Rate',
-        xaxis_title='Steps',
+        xaxis_title='Time',
         yaxis_title='Learning Rate',
         paper_bgcolor='rgba(0,0,0,0)',
         plot_bgcolor='rgba(0,0,0,0)',
@@ -232,17 +215,26 @@ with metric_cols[1]:
     st.plotly_chart(fig_lr, use_container_width=True)
 
 # Leaderboard and Map
+import pandas as pd
+import pydeck as pdk
+
 st.markdown("### Network Overview")
 col1, col2 = st.columns([3, 2])
 
 with col1:
-    if latest_metrics:
-        miner_df = pd.DataFrame([{
+    top_miners = metrics_manager.get_top_miners(LEADERBOARD_SIZE, by='hashrate', repo=selected_repo)
+    if top_miners:
+        latest_job_id = latest_job.job_id if latest_job else None
+        # Already ranked by the leaderboard index, no sorting needed here
+        miner_df = metrics_manager.cached_query(('leaderboard', selected_repo), lambda: pd.DataFrame([{
             'Miner UID': m['miner_uid'],
-            'MH/s': round(m['metrics'].get('hashrate', 0) / 1e6, 2),
-            'Location': m.get('location', 'Unknown'),
-            'Status': 'Active'
-        } for m in latest_metrics]).sort_values('MH/s', ascending=False)
+            'MH/s': round(m['hashrate'] / 1e6, 2),
+            'Best Loss': m['best_loss'],
+            'Submissions': m['submissions'],
+            'Last Seen': pd.to_datetime(m['last_seen'], unit='s', errors='coerce'),
+            'Location': m['location'],
+            'Status': 'Active' if m['latest_job_id'] == latest_job_id else 'Idle'
+        } for m in top_miners]))
         
         st.dataframe(miner_df, use_container_width=True)
 
@@ -274,6 +266,12 @@ with col2:
         ]
     ))
 
-# Auto-refresh
-time.sleep(5)
-st.rerun()
+instrumentation.observe("render", time.perf_counter() - render_start, frontend="streamlit")
+
+# Timings and counters of ingestion and rendering in this server process
+with st.expander("Status"):
+    metrics_manager.update_gauges()
+    st.markdown("#### Timings")
+    st.dataframe(pd.DataFrame(instrumentation.span_rows()), use_container_width=True)
+    st.markdown("#### Counters")
+    st.dataframe(pd.DataFrame(instrumentation.counter_rows()), use_container_width=True)
@@ -0,0 +1,176 @@
+"""
+Cold start of the Streamlit (app.py) and Gradio (dash.py) frontends after a restart.
+
+A store is first filled from the offline `FakeHub`, leaving the index
+snapshot of that ingest beside it, as a running Space would before being
+restarted. Every measurement then runs in a fresh Python process, like a
+restarted Space, with the fake Hub still at the ingested head so the
+background refresh finds nothing new:
+
+- snapshot: indexes restored from the snapshot, plotting libraries and
+  pandas imported on first use;
+- replay: snapshots off (METRICS_SNAPSHOT_PATH=""), so every stored entry
+  is decoded again;
+- replay+eager: also imports pandas and the plotting libraries up front, as
+  the frontends did before deferring them.
+
+Reported per frontend and mode (medians over `--repeat` processes):
+- index: the manager's index load (`startup` span, phase=indexes)
+- first paint: the session's first data on screen as the frontend records
+  it (`first_paint` span): app.py's first script run up to the training
+  progress, or dash.py's first update
+- total: from process start to the first paint, including every import and
+  the manager; for Streamlit up to the first paint of the first `AppTest`
+  run, for Gradio building the dashboard and its first update (the web
+  server is not started)
+
+Usage:
+    python benchmarks/cold_start.py [--commits N] [--repeat R]
+"""
+import argparse
+import contextlib
+import io
+import json
+import logging
+import os
+import shutil
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+# Started before anything else is imported by a measured child process
+process_start = time.perf_counter()
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+REPO_ID = "bench/metrics"
+STORE_NAME = "metrics.db"
+# Imported up front by the frontends before they deferred them
+EAGER_MODULES = {
+    'streamlit': ['pandas', 'plotly.graph_objects', 'pydeck'],
+    'gradio': ['pandas', 'plotly.express', 'plotly.graph_objects'],
+}
+MODES = ['replay+eager', 'replay', 'snapshot']
+
+def fill_store(directory, commits):
+    """Ingest `commits` commits from the fake Hub into a store in `directory`, snapshot included."""
+    from benchmarks.fake_hub import FakeHub
+    from utils.MetricsManager import MetricsManager
+    with FakeHub(commits) as hub, contextlib.redirect_stdout(io.StringIO()):
+        manager = MetricsManager(REPO_ID, "offline", store_path=os.path.join(directory, STORE_NAME), api=hub)
+        if not manager._fetch():
+            raise RuntimeError(manager.last_error)
+        manager.fetch_pool.shutdown()
+
+def patch_manager(directory, commits):
+    """Point every `MetricsManager` at the filled store and an unchanged fake Hub; return the created ones."""
+    import utils.MetricsManager
+    from benchmarks.fake_hub import FakeHub
+    hub = FakeHub(commits)
+    managers = []
+
+    class OfflineMetricsManager(utils.MetricsManager.MetricsManager):
+        def __init__(self, repo_name, token, store_path=None, api=None):
+            super().__init__(repo_name, token, store_path=os.path.join(directory, STORE_NAME), api=hub)
+            managers.append(self)
+
+    utils.MetricsManager.MetricsManager = OfflineMetricsManager
+    return managers
+
+def span_seconds(name, **labels):
+    from utils.Instrumentation import instrumentation
+    label_text = ", ".join(f"{label}={value}" for label, value in sorted(labels.items()))
+    rows = [row for row in instrumentation.span_rows() if row['span'] == name and row['labels'] == label_text]
+    return rows[0]['last_ms'] / 1000 if rows else float('nan')
+
+def child_streamlit(directory, commits):
+    from streamlit.testing.v1 import AppTest
+    managers = patch_manager(directory, commits)
+    app = AppTest.from_file(os.path.join(ROOT, "app.py"), default_timeout=600)
+    run_start = time.perf_counter()
+    app.run()
+    if app.exception:
+        raise RuntimeError(app.exception[0].message)
+    for manager in managers:
+        manager.stop_background_refresh()
+    # The script keeps rendering after its first paint, which it times from its own start
+    first_paint = span_seconds("first_paint", frontend="streamlit")
+    return run_start - process_start + first_paint, first_paint
+
+def child_gradio(directory, commits):
+    import asyncio
+    managers = patch_manager(directory, commits)
+    # dash.py binds MetricsManager at import, so it is imported after patching
+    import dash
+    dash.create_dashboard()
+
+    async def first_update():
+        stream = dash.stream_dashboard_updates(managers[-1])
+        await stream.__anext__()
+        await stream.aclose()
+
+    asyncio.run(first_update())
+    total = time.perf_counter() - process_start
+    for manager in managers:
+        manager.stop_background_refresh()
+    return total, span_seconds("first_paint", frontend="gradio")
+
+def run_child(args):
+    logging.disable(logging.WARNING)
+    os.environ.update(HF_TOKEN="offline", CENTRAL_REPO=REPO_ID)
+    if args.mode != 'snapshot':
+        os.environ["METRICS_SNAPSHOT_PATH"] = ""
+    if args.mode.endswith('+eager'):
+        for module in EAGER_MODULES[args.child]:
+            __import__(module)
+    with contextlib.redirect_stdout(io.StringIO()):
+        if args.child == 'streamlit':
+            total, first_paint = child_streamlit(args.directory, args.commits)
+        else:
+            total, first_paint = child_gradio(args.directory, args.commits)
+    print(json.dumps({'index': span_seconds("startup", phase="indexes"), 'first_paint': first_paint,
+                      'total': total}))
+
+def measure(frontend, mode, directory, commits):
+    output = subprocess.run(
+        [sys.executable, os.path.abspath(__file__), '--child', frontend, '--mode', mode,
+         '--directory', directory, '--commits', str(commits)],
+        capture_output=True, text=True, check=True, cwd=ROOT
+    ).stdout
+    return json.loads(output.strip().splitlines()[-1])
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--commits', type=int, default=20000, help="commits in the store before the restart")
+    parser.add_argument('--repeat', type=int, default=3, help="processes measured per frontend and mode")
+    parser.add_argument('--frontend', choices=['streamlit', 'gradio'], action='append',
+                        help="frontend to measure, repeatable (default: both)")
+    parser.add_argument('--child', choices=['streamlit', 'gradio'], help=argparse.SUPPRESS)
+    parser.add_argument('--mode', choices=MODES, help=argparse.SUPPRESS)
+    parser.add_argument('--directory', help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.child:
+        run_child(args)
+        return
+
+    directory = tempfile.mkdtemp(prefix="cold-start-")
+    try:
+        logging.disable(logging.WARNING)
+        fill_store(directory, args.commits)
+        print(f"{args.commits:,} stored entries")
+        print(f"{'frontend':<10}{'mode':<14}{'index':>9}{'first paint':>13}{'total':>9}")
+        for frontend in args.frontend or ['streamlit', 'gradio']:
+            for mode in MODES:
+                runs = [measure(frontend, mode, directory, args.commits) for _ in range(args.repeat)]
+                index, first_paint, total = (statistics.median(run[key] for run in runs)
+                                             for key in ('index', 'first_paint', 'total'))
+                print(f"{frontend:<10}{mode:<14}{index:>8.2f}s{first_paint:>12.2f}s{total:>8.2f}s")
+    finally:
+        shutil.rmtree(directory, ignore_errors=True)
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,137 @@
+"""
+Offline stand-in for the Hugging Face Hub, serving a synthetic metrics repository.
+
+`FakeHub` implements the `HfApi` methods ingestion calls (`list_repo_commits`,
+`list_repo_tree`, `hf_hub_download` and `repo_info`), so it can be passed as
+`api=` to `fetch_training_metrics_commits` and `get_repo_head`. Commit `i`
+rewrites the metrics files of `files_per_commit` miners in turn, like miners
+pushing submissions to the central repo. Trees and file contents are derived
+from the commit index, so histories of any length cost no memory up front.
+Every request sleeps for `latency` seconds and is counted.
+"""
+import os
+import shutil
+import tempfile
+import threading
+import time
+from collections import Counter
+from datetime import datetime, timedelta, timezone
+from types import SimpleNamespace
+
+from huggingface_hub.hf_api import GitCommitInfo, RepoFile
+
+# Commits per page of a commit listing, as served by the Hub
+COMMITS_PAGE_SIZE = 50
+
+START_TIME = datetime(2024, 1, 1, tzinfo=timezone.utc)
+
+def metrics_file(sequence, miners, commits_per_job):
+    """JSON content of the `sequence`-th metrics file pushed, shaped like a miner's submission."""
+    miner = sequence % miners
+    timestamp = START_TIME + timedelta(seconds=sequence)
+    return (
+        '{"miner_uid": %d, "model_repo": "org/model-%d", "timestamp": "%s", "metrics": '
+        '{"job_id": "job-%d", "final_loss": %r, "perplexity": %r, "tokens_per_second": %r, '
+        '"inner_lr": 0.0001, "hashrate": %r, "total_tokens": 2048.0}}'
+        % (miner + 1, miner, timestamp.strftime("%Y%m%d_%H%M%S"), sequence // commits_per_job,
+           4.0 / (1 + sequence % 1000), 50.0 / (1 + sequence % 1000), 1000.0 + sequence % 97, 1e6 * (miner % 13))
+    ).encode('utf-8')
+
+class FakeHub:
+    """
+    Synthetic repository of `commits` commits behind the `HfApi` interface.
+
+    Every `repo_id` is served the same history; `push` appends commits to it.
+    """
+
+    def __init__(self, commits=1000, files_per_commit=1, miners=64, latency=0.0, commits_per_job=1000):
+        self.commits = commits
+        self.files_per_commit = files_per_commit
+        self.miners = miners
+        self.latency = latency
+        self.commits_per_job = commits_per_job
+        self.requests = Counter()
+        self.bytes_served = 0
+        self._lock = threading.Lock()
+        self._download_dir = tempfile.mkdtemp(prefix="fake-hub-")
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def close(self):
+        shutil.rmtree(self._download_dir, ignore_errors=True)
+
+    def push(self, commits=1):
+        with self._lock:
+            self.commits += commits
+
+    def reset_counters(self):
+        with self._lock:
+            self.requests.clear()
+            self.bytes_served = 0
+
+    def _request(self, kind, size=0):
+        with self._lock:
+            self.requests[kind] += 1
+            self.bytes_served += size
+        if self.latency:
+            time.sleep(self.latency)
+
+    @staticmethod
+    def commit_id(index):
+        return f"{index:040x}"
+
+    def _commit(self, index):
+        return GitCommitInfo(
+            commit_id=self.commit_id(index),
+            authors=["miner"],
+            created_at=START_TIME + timedelta(minutes=index),
+            title=f"Upload metrics ({index})",
+            message="",
+            formatted_title=None,
+            formatted_message=None
+        )
+
+    def _last_write(self, miner, index):
+        """Sequence number of the latest write to `miner`'s file up to commit `index`, or None."""
+        top = (index + 1) * self.files_per_commit - 1
+        sequence = top - (top - miner) % self.miners
+        return sequence if sequence >= 0 else None
+
+    def repo_info(self, repo_id, **kwargs):
+        self._request('repo_info')
+        return SimpleNamespace(id=repo_id, sha=self.commit_id(self.commits - 1) if self.commits else None)
+
+    def list_repo_commits(self, repo_id, **kwargs):
+        """Commits newest first, requesting each page only when iteration reaches it."""
+        head = self.commits - 1
+        for page_start in range(head, -1, -COMMITS_PAGE_SIZE):
+            self._request('list_repo_commits')
+            for index in range(page_start, max(page_start - COMMITS_PAGE_SIZE, -1), -1):
+                yield self._commit(index)
+
+    def list_repo_tree(self, repo_id, path_in_repo=None, revision=None, **kwargs):
+        index = int(revision, 16) if revision is not None else self.commits - 1
+        files = [RepoFile(path=".gitattributes", size=1519, oid="0" * 40)]
+        for miner in range(self.miners):
+            sequence = self._last_write(miner, index)
+            if sequence is not None:
+                files.append(RepoFile(path=f"miner_{miner + 1}.json", size=256, oid=f"{sequence + 1:040x}"))
+        self._request('list_repo_tree')
+        return files
+
+    def hf_hub_download(self, repo_id, filename, *, revision=None, **kwargs):
+        index = int(revision, 16) if revision is not None else self.commits - 1
+        miner = int(filename[len("miner_"):-len(".json")]) - 1
+        sequence = self._last_write(miner, index)
+        if sequence is None:
+            raise FileNotFoundError(filename)
+        content = metrics_file(sequence, self.miners, self.commits_per_job)
+        path = os.path.join(self._download_dir, f"{sequence + 1:040x}")
+        with open(path, 'wb') as f:
+            f.write(content)
+        self._request('hf_hub_download', len(content))
+        return path
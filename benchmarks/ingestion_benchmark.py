@@ -0,0 +1,96 @@
+"""
+Ingestion cost of `fetch_training_metrics_commits` against an offline synthetic Hub.
+
+For each history size, runs a full refresh from an empty `IngestionState`,
+then pushes `--new-commits` commits and runs an incremental refresh, and
+reports wall time, Hub requests, bytes downloaded and peak memory. Peak
+memory is the growth of the process's resident set over the run, sampled
+from /proc (Linux only) so the run is not slowed down like under
+tracemalloc.
+
+Usage:
+    python benchmarks/ingestion_benchmark.py [SIZE ...]    # default: 1000 10000 100000
+"""
+import argparse
+import contextlib
+import gc
+import io
+import os
+import sys
+import threading
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from benchmarks.fake_hub import FakeHub
+from utils.HFManager import IngestionState, fetch_training_metrics_commits
+
+REPO_ID = "bench/metrics"
+
+def ingest(hub, state, workers):
+    # The ingestion path reports progress with print; keep the table readable
+    with contextlib.redirect_stdout(io.StringIO()):
+        entries = fetch_training_metrics_commits(REPO_ID, state=state, max_workers=workers, api=hub)
+    if state.last_error:
+        raise RuntimeError(state.last_error)
+    return entries
+
+def resident_bytes():
+    with open('/proc/self/statm') as f:
+        return int(f.read().split()[1]) * os.sysconf('SC_PAGE_SIZE')
+
+class PeakResident:
+    """Samples the resident set size from a thread; `peak` is the growth over the starting size."""
+
+    def __init__(self, interval=0.01):
+        self.interval = interval
+        self.peak = 0
+        self._stop = threading.Event()
+
+    def __enter__(self):
+        self._start = resident_bytes()
+        self._thread = threading.Thread(target=self._sample, daemon=True)
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc):
+        self._stop.set()
+        self._thread.join()
+        self.peak = max(self.peak, resident_bytes() - self._start)
+
+    def _sample(self):
+        while not self._stop.wait(self.interval):
+            self.peak = max(self.peak, resident_bytes() - self._start)
+
+def measure(hub, state, workers):
+    """Return (entries, seconds, requests, bytes downloaded, peak bytes) of one ingestion run."""
+    hub.reset_counters()
+    gc.collect()
+    with PeakResident() as memory:
+        start = time.perf_counter()
+        entries = len(ingest(hub, state, workers))
+        elapsed = time.perf_counter() - start
+    return entries, elapsed, sum(hub.requests.values()), hub.bytes_served, memory.peak
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('sizes', nargs='*', type=int, default=[1000, 10000, 100000])
+    parser.add_argument('--files-per-commit', type=int, default=1)
+    parser.add_argument('--miners', type=int, default=64)
+    parser.add_argument('--latency', type=float, default=0.0, help="seconds added to every Hub request")
+    parser.add_argument('--workers', type=int, default=8)
+    parser.add_argument('--new-commits', type=int, default=10, help="commits pushed before the incremental refresh")
+    args = parser.parse_args()
+
+    print(f"{'commits':>10}  {'refresh':<12}{'entries':>10}{'wall':>10}{'requests':>10}{'downloaded':>12}{'peak':>10}")
+    for size in args.sizes:
+        with FakeHub(size, args.files_per_commit, args.miners, args.latency) as hub:
+            state = IngestionState()
+            for name, new_commits in [('full', 0), ('incremental', args.new_commits)]:
+                hub.push(new_commits)
+                entries, elapsed, requests, downloaded, peak = measure(hub, state, args.workers)
+                print(f"{size:>10,}  {name:<12}{entries:>10,}{elapsed:>9.2f}s{requests:>10,}"
+                      f"{downloaded / 2**20:>10.1f}MB{peak / 2**20:>8.1f}MB")
+
+if __name__ == '__main__':
+    main()
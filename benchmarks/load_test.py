@@ -0,0 +1,221 @@
+"""
+Multi-viewer load test of the Streamlit (app.py) and Gradio (dash.py) frontends.
+
+Both frontends run headless against the offline `FakeHub`, each with a
+temporary store and its usual background refresher. For every session
+count, `--refreshes` times in a row the test pushes new commits to the fake
+Hub, waits for the refresher to ingest them, and then has every session
+re-render, as live viewers would:
+
+- a Streamlit session is an `AppTest` of app.py, rerun like the
+  version-check fragment does on new data. AppTest keeps global runtime
+  state, so sessions rerun one after another; renders are CPU bound, so
+  concurrent script threads would queue on the GIL much the same way;
+- a Gradio session is the `stream_dashboard_updates` stream dash.py runs for
+  each browser tab, with its outputs serialized like Gradio does before
+  sending them.
+
+Reported per frontend and session count:
+- CPU time of the whole process per refresh, from the ingest to the last render
+- render latency percentiles, from the data change to each session's render
+- resident memory added per session
+
+Usage:
+    python benchmarks/load_test.py [--sessions N ...] [--refreshes R] [--frontend streamlit|gradio]
+"""
+import argparse
+import asyncio
+import contextlib
+import io
+import logging
+import os
+import shutil
+import sys
+import tempfile
+import time
+
+import numpy as np
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+# Poll the fake Hub often, so a refresh is ingested soon after its push
+os.environ.setdefault("POLL_MIN_SECONDS", "0.2")
+os.environ.setdefault("POLL_MAX_SECONDS", "0.2")
+os.environ.update(HF_TOKEN="offline", CENTRAL_REPO="bench/metrics")
+
+import gradio as gr
+import streamlit as st
+from streamlit.testing.v1 import AppTest
+
+import dash
+import utils.MetricsManager
+from benchmarks.fake_hub import FakeHub
+from benchmarks.ingestion_benchmark import resident_bytes
+
+INGEST_TIMEOUT = 60
+
+# Output components of dash.py's dashboard, in handler output order
+GRADIO_OUTPUTS = [gr.Textbox(), gr.Textbox(), gr.Textbox(), gr.Plot(), gr.Dataframe(), gr.Textbox(), gr.Textbox(),
+                  gr.Dataframe(), gr.Dataframe()]
+
+class OfflineBackend:
+    """
+    Serves the frontends from a `FakeHub` and a temporary store.
+
+    While active, `MetricsManager` is replaced by a subclass that ignores the
+    store path and Hub it is given, so app.py picks it up unchanged.
+    """
+
+    def __init__(self, commits, latency):
+        self.hub = FakeHub(commits, latency=latency)
+        self.directory = tempfile.mkdtemp(prefix="load-test-")
+        self.managers = []
+
+    def __enter__(self):
+        backend = self
+        self._original = utils.MetricsManager.MetricsManager
+
+        class OfflineMetricsManager(self._original):
+            def __init__(self, repo_name, token, store_path=None, api=None):
+                super().__init__(repo_name, token, store_path=os.path.join(backend.directory, "metrics.db"),
+                                 api=backend.hub)
+                backend.managers.append(self)
+
+        utils.MetricsManager.MetricsManager = OfflineMetricsManager
+        return self
+
+    def __exit__(self, *exc):
+        for manager in self.managers:
+            manager.stop_background_refresh()
+        utils.MetricsManager.MetricsManager = self._original
+        st.cache_resource.clear()
+        self.hub.close()
+        shutil.rmtree(self.directory, ignore_errors=True)
+
+    def create_manager(self):
+        manager = utils.MetricsManager.MetricsManager(os.environ["CENTRAL_REPO"], os.environ["HF_TOKEN"])
+        manager.start_background_refresh()
+        return manager
+
+    def push(self, manager, commits):
+        """Push commits to the fake Hub and wait for them to be ingested; return when the data changed."""
+        version = manager.data_version
+        self.hub.push(commits)
+        deadline = time.monotonic() + INGEST_TIMEOUT
+        while manager.data_version == version:
+            if time.monotonic() > deadline:
+                raise TimeoutError("Pushed commits were not ingested")
+            time.sleep(0.005)
+        return time.perf_counter()
+
+    def wait_for_data(self, manager):
+        deadline = time.monotonic() + INGEST_TIMEOUT
+        while not manager.last_update:
+            if time.monotonic() > deadline:
+                raise TimeoutError(f"Initial ingest failed: {manager.last_error}")
+            time.sleep(0.01)
+
+class Result:
+    def __init__(self):
+        self.latencies = []
+        self.cpu = []
+        self.memory_per_session = 0.0
+
+def run_streamlit(backend, sessions, refreshes, commits):
+    result = Result()
+    # The first session creates the shared manager through st.cache_resource
+    first = AppTest.from_file(os.path.join(ROOT, "app.py"), default_timeout=INGEST_TIMEOUT)
+    first.run()
+    manager = backend.managers[-1]
+    backend.wait_for_data(manager)
+
+    before = resident_bytes()
+    apps = [first] + [AppTest.from_file(os.path.join(ROOT, "app.py"), default_timeout=INGEST_TIMEOUT)
+                      for _ in range(sessions - 1)]
+    for app in apps[1:]:
+        app.run()
+    result.memory_per_session = (resident_bytes() - before) / sessions
+
+    def rerun(app):
+        app.run()
+        if app.exception:
+            raise RuntimeError(app.exception[0].message)
+        return time.perf_counter()
+
+    for _ in range(refreshes):
+        cpu_start = time.process_time()
+        changed = backend.push(manager, commits)
+        rendered = [rerun(app) for app in apps]
+        result.cpu.append(time.process_time() - cpu_start)
+        result.latencies += [end - changed for end in rendered]
+    return result
+
+def serialize(outputs):
+    """Encode handler outputs the way Gradio does before sending them to a session."""
+    for component, value in zip(GRADIO_OUTPUTS, outputs):
+        data = component.postprocess(value)
+        if hasattr(data, "model_dump_json"):
+            data.model_dump_json()
+
+async def run_gradio(backend, sessions, refreshes, commits):
+    result = Result()
+    manager = backend.create_manager()
+    backend.wait_for_data(manager)
+
+    renders = [[] for _ in range(sessions)]
+
+    async def session(index):
+        async for outputs in dash.stream_dashboard_updates(manager):
+            serialize(outputs)
+            renders[index].append(time.perf_counter())
+
+    before = resident_bytes()
+    tasks = [asyncio.create_task(session(index)) for index in range(sessions)]
+    while min(len(times) for times in renders) < 1:
+        await asyncio.sleep(0.01)
+    result.memory_per_session = (resident_bytes() - before) / sessions
+
+    loop = asyncio.get_running_loop()
+    for refresh in range(1, refreshes + 1):
+        cpu_start = time.process_time()
+        # Waiting for the ingest blocks, so keep it off the loop the sessions run on
+        changed = await loop.run_in_executor(None, backend.push, manager, commits)
+        while min(len(times) for times in renders) <= refresh:
+            await asyncio.sleep(0.001)
+        result.cpu.append(time.process_time() - cpu_start)
+        result.latencies += [times[refresh] - changed for times in renders]
+
+    for task in tasks:
+        task.cancel()
+    await asyncio.gather(*tasks, return_exceptions=True)
+    return result
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--sessions', nargs='*', type=int, default=[1, 10, 50])
+    parser.add_argument('--refreshes', type=int, default=10)
+    parser.add_argument('--frontend', choices=['streamlit', 'gradio'], action='append',
+                        help="frontend to test, repeatable (default: both)")
+    parser.add_argument('--history', type=int, default=10000, help="commits ingested before the sessions start")
+    parser.add_argument('--commits', type=int, default=10, help="commits pushed per refresh")
+    parser.add_argument('--latency', type=float, default=0.0, help="seconds added to every Hub request")
+    args = parser.parse_args()
+
+    # Ingestion and the frontends log every refresh; only the results are of interest here
+    logging.disable(logging.WARNING)
+    print(f"{'frontend':<10}{'sessions':>9}{'cpu/refresh':>13}{'p50':>9}{'p90':>9}{'p99':>9}{'mem/session':>13}")
+    for frontend in args.frontend or ['streamlit', 'gradio']:
+        for sessions in args.sessions:
+            with OfflineBackend(args.history, args.latency) as backend, \
+                    contextlib.redirect_stdout(io.StringIO()):
+                if frontend == 'streamlit':
+                    result = run_streamlit(backend, sessions, args.refreshes, args.commits)
+                else:
+                    result = asyncio.run(run_gradio(backend, sessions, args.refreshes, args.commits))
+            p50, p90, p99 = np.percentile(result.latencies, [50, 90, 99]) * 1000
+            print(f"{frontend:<10}{sessions:>9}{np.mean(result.cpu) * 1000:>11.0f}ms"
+                  f"{p50:>7.0f}ms{p90:>7.0f}ms{p99:>7.0f}ms{result.memory_per_session / 2**20:>11.2f}MB")
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,138 @@
+"""
+Memory footprint of ingested metrics entries in their different in-memory forms.
+
+Compares, for each size, the entry dicts built by `fetch_training_metrics_commits`,
+the typed columns of `MetricsColumns` and the `MetricsRecord` list served for
+the latest job. The other structures kept per repository are measured too:
+the per-job `JobAggregates` and the `IngestionState` loaded from a store
+holding the same entries, whose deduplication keys stay in SQLite. Sizes are
+measured with tracemalloc, one form at a time; "peak" includes the transient
+entry batches a form is built from.
+
+Usage:
+    python benchmarks/memory_benchmark.py [SIZE ...]    # default: 100000 1000000
+"""
+import argparse
+import gc
+import json
+import os
+import sys
+import tempfile
+import tracemalloc
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from utils.HFManager import IngestionState
+from utils.JobAggregates import JobAggregates
+from utils.MetricsColumns import MetricsColumns, parse_timestamps
+from utils.MetricsRecord import intern_value
+from utils.MetricsStore import MetricsStore
+
+MINERS = 256
+JOBS = 4
+BATCH_SIZE = 10000
+REPO_ID = "bench/metrics"
+
+def metrics_file(i, size):
+    """JSON content of the i-th of `size` synthetic submissions, shaped like a miner's metrics file."""
+    seconds = i % 86400
+    return json.dumps({
+        "miner_uid": f"miner-{i % MINERS}",
+        "model_repo": f"org/model-{i % MINERS}",
+        "timestamp": f"202401{1 + i // 86400 % 28:02d}_{seconds // 3600:02d}{seconds // 60 % 60:02d}{seconds % 60:02d}",
+        "metrics": {
+            "job_id": f"job-{i * JOBS // size}",
+            "final_loss": 4.0 / (1 + i % 1000),
+            "perplexity": 50.0 / (1 + i % 1000),
+            "tokens_per_second": 1000.0 + i % 97,
+            "inner_lr": 1e-4,
+            "hashrate": 1e6 * (i % 13),
+            "total_tokens": 2048.0,
+        },
+    })
+
+def load_entry(content):
+    """Same entry `_load_metrics_entry` builds from a downloaded file."""
+    data = json.loads(content)
+    job_id = intern_value(data["metrics"]["job_id"])
+    data["metrics"]["job_id"] = job_id
+    return {
+        "model_repo": intern_value(data.get("model_repo", "unknown")),
+        "metrics": data["metrics"],
+        "miner_uid": intern_value(data["miner_uid"]),
+        "job_id": job_id,
+        "timestamp": data.get("timestamp", "unknown"),
+    }
+
+def entry_batches(size):
+    for start in range(0, size, BATCH_SIZE):
+        yield [load_entry(metrics_file(i, size)) for i in range(start, min(start + BATCH_SIZE, size))]
+
+def measure(build, rows=None):
+    """
+    Return (rows, retained bytes, peak bytes) of building and keeping `build()`'s result.
+
+    `rows` is the number of entries the result covers, its length by default.
+    """
+    gc.collect()
+    tracemalloc.start()
+    result = build()
+    current, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    rows = len(result) if rows is None else rows
+    del result
+    gc.collect()
+    return rows, current, peak
+
+def build_dicts(size):
+    return [entry for batch in entry_batches(size) for entry in batch]
+
+def build_columns(size):
+    columns = MetricsColumns()
+    for batch in entry_batches(size):
+        columns.extend(batch)
+    return columns
+
+def build_aggregates(size):
+    aggregates = JobAggregates()
+    for batch in entry_batches(size):
+        aggregates.update(batch, parse_timestamps([entry['timestamp'] for entry in batch]))
+    return aggregates
+
+def fill_store(path, size):
+    """Store `size` entries and the blob id of each one's file, as ingestion would."""
+    store = MetricsStore(path)
+    state = IngestionState(last_commit_id="bench")
+    start = 0
+    for batch in entry_batches(size):
+        state.seen_blobs = {f"{i + 1:040x}" for i in range(start, start + len(batch))}
+        store.save_batch(REPO_ID, batch, state)
+        start += len(batch)
+    return store
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('sizes', nargs='*', type=int, default=[100000, 1000000])
+    args = parser.parse_args()
+
+    print(f"{'entries':>10}  {'form':<22}{'rows':>10}{'retained':>12}{'per row':>10}{'peak':>12}")
+    for size in args.sizes:
+        columns = build_columns(size)
+        latest_job_id = max(columns.categories['job_id'])
+        with tempfile.TemporaryDirectory(prefix="memory-benchmark-") as directory:
+            store = fill_store(os.path.join(directory, "metrics.db"), size)
+            forms = [
+                ('entry dicts', lambda: build_dicts(size), None),
+                ('MetricsColumns', lambda: build_columns(size), None),
+                ('MetricsRecord (1 job)', lambda: columns.records(job_id=latest_job_id), None),
+                ('MetricsRecord (all)', lambda: columns.records(), None),
+                ('JobAggregates', lambda: build_aggregates(size), size),
+                ('IngestionState', lambda: store.load_state(REPO_ID), size),
+            ]
+            for name, build, rows in forms:
+                rows, retained, peak = measure(build, rows)
+                print(f"{size:>10,}  {name:<22}{rows:>10,}{retained / 2**20:>10.1f}MB"
+                      f"{retained / max(rows, 1):>9.0f}B{peak / 2**20:>10.1f}MB")
+
+if __name__ == '__main__':
+    main()
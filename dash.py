@@ -1,10 +1,11 @@
+import time
+# Started before anything heavy loads, to measure the dashboard's startup time
+import_start = time.perf_counter()
+
 import gradio as gr
-import pandas as pd
-import plotly.express as px
-import plotly.graph_objects as go
-from datetime import datetime
 import logging
-from utils.HFManager import fetch_training_metrics_commits
+from utils.Instrumentation import instrumentation
+from utils.MetricsManager import MetricsManager
 import os
 from dotenv import load_dotenv
 
@@ -12,88 +13,23 @@ from dotenv import load_dotenv
 load_dotenv()
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
 
-class MetricsManager:
-    def __init__(self, repo_name, token):
-        if not repo_name:
-            raise ValueError("Repository name is required")
-        if not token:
-            raise ValueError("Hugging Face token is required")
-            
-        self.repo_name = repo_name
-        self.token = token
-        self.last_update = None
-        self.metrics_cache = []
-        self.update_interval = 60  # seconds
-        logging.info(f"MetricsManager initialized for repo: {repo_name}")
-
-    def needs_update(self):
-        if not self.last_update:
-            return True
-        return (datetime.now() - self.last_update).total_seconds() > self.update_interval
-
-    def fetch_latest_metrics(self):
-        if self.needs_update():
-            logging.info("Fetching fresh metrics from HuggingFace...")
-            try:
-                self.metrics_cache = fetch_training_metrics_commits(
-                    self.repo_name, 
-                    token=self.token
-                )
-                self.last_update = datetime.now()
-                logging.info(f"Fetched {len(self.metrics_cache)} metrics entries")
-            except Exception as e:
-                logging.error(f"Error fetching metrics: {str(e)}")
-                return []
-        return self.metrics_cache
-
-    def get_latest_job_metrics(self):
-        metrics = self.fetch_latest_metrics()
-        if not metrics:
-            return None
-
-        # Group metrics by job_id
-        jobs = {}
-        for entry in metrics:
-            job_id = entry['metrics']['job_id']
-            if job_id not in jobs:
-                jobs[job_id] = []
-            jobs[job_id].append(entry)
-
-        # Get the latest job (assuming job_ids are timestamp-based or sequential)
-        latest_job_id = max(jobs.keys())
-        return jobs[latest_job_id]
-
-    def get_historical_metrics(self):
-        metrics = self.fetch_latest_metrics()
-        if not metrics:
-            return pd.DataFrame()
-
-        # Convert metrics to DataFrame for easier analysis
-        records = []
-        for entry in metrics:
-            record = {
-                'timestamp': entry['timestamp'],
-                'miner_uid': entry['miner_uid'],
-                'job_id': entry['metrics']['job_id'],
-                'final_loss': entry['metrics'].get('final_loss', None),
-                'model_repo': entry['model_repo']
-            }
-            records.append(record)
-        
-        df = pd.DataFrame(records)
-        
-        # Convert timestamp string to datetime
-        try:
-            df['timestamp'] = pd.to_datetime(df['timestamp'], format='%Y%m%d_%H%M%S')
-        except ValueError:
-            try:
-                df['timestamp'] = pd.to_datetime(df['timestamp'], format='mixed')
-            except:
-                logging.warning("Could not parse some timestamp values")
-        
-        return df.sort_values('timestamp')
+# Number of miners shown in the performance table
+LEADERBOARD_SIZE = 50
+
+# Maximum number of points sent to the browser per chart
+CHART_POINT_BUDGETS = {
+    'loss': int(os.getenv("LOSS_CHART_POINTS", "1000")),
+}
+
+# Without new data, the "last update" age is still refreshed this often (seconds)
+IDLE_REFRESH_SECONDS = 30
+
+# pandas and plotly are imported by the functions using them, so the
+# dashboard is up before they load instead of blocking startup on them
 
 def create_loss_chart(df):
+    import plotly.express as px
+    import plotly.graph_objects as go
     if df.empty:
         return go.Figure()
     
@@ -105,22 +41,38 @@ def create_loss_chart(df):
     )
     return fig
 
-def create_miner_performance_table(metrics):
-    if not metrics:
+def create_miner_performance_table(top_miners):
+    import pandas as pd
+    if not top_miners:
         return pd.DataFrame()
     
+    # Rows come ranked by best loss from the leaderboard index
     miner_df = pd.DataFrame([
         {
             'Miner UID': m['miner_uid'],
-            'Final Loss': m['metrics'].get('final_loss', float('inf')),
+            'Best Loss': m['best_loss'],
+            'Latest Loss': m['latest_loss'],
+            'Submissions': m['submissions'],
             'Model Repo': m['model_repo']
         }
-        for m in metrics
-    ]).sort_values('Final Loss')
+        for m in top_miners
+    ])
     
     return miner_df
 
+def create_status_tables(metrics_manager):
+    import pandas as pd
+    metrics_manager.update_gauges()
+    return pd.DataFrame(instrumentation.span_rows()), pd.DataFrame(instrumentation.counter_rows())
+
 def update_dashboard(metrics_manager):
+    with instrumentation.span("render", frontend="gradio"):
+        outputs = render_dashboard(metrics_manager)
+    return outputs + create_status_tables(metrics_manager)
+
+def render_dashboard(metrics_manager):
+    import pandas as pd
+    import plotly.graph_objects as go
     try:
         latest_metrics = metrics_manager.get_latest_job_metrics()
         if not latest_metrics:
@@ -133,20 +85,28 @@ def update_dashboard(metrics_manager):
 
         # Get latest entry
         latest_entry = latest_metrics[-1]
-        job_id = latest_entry['metrics']['job_id']
+        job_id = latest_entry.job_id
         active_miners = len(latest_metrics)
-        best_loss = f"{latest_entry['metrics'].get('final_loss', 'N/A'):.4f}"
+        best_loss = f"{latest_entry.final_loss:.4f}"
 
-        # Historical metrics
-        df = metrics_manager.get_historical_metrics()
-        loss_chart = create_loss_chart(df)
+        # Historical metrics, downsampled to the chart's point budget
+        df = metrics_manager.get_chart_series('final_loss', CHART_POINT_BUDGETS['loss'])
+        loss_chart = metrics_manager.cached_query('loss_chart', lambda: create_loss_chart(df))
         
         # Miner performance
-        performance_table = create_miner_performance_table(latest_metrics)
+        top_miners = metrics_manager.get_top_miners(LEADERBOARD_SIZE, by='best_loss')
+        performance_table = metrics_manager.cached_query(
+            'performance_table',
+            lambda: create_miner_performance_table(top_miners)
+        )
         
         # Network status
         last_update = metrics_manager.last_update.strftime("%Y-%m-%d %H:%M:%S") if metrics_manager.last_update else "Never"
-        active_jobs = len(set(m['metrics']['job_id'] for m in latest_metrics))
+        if metrics_manager.last_update:
+            last_update += f" ({metrics_manager.snapshot_age():.0f}s ago)"
+        if metrics_manager.last_error:
+            last_update += " - latest refresh failed, showing previous data"
+        active_jobs = len(set(m.job_id for m in latest_metrics))
 
         return (
             job_id, str(active_miners), best_loss,
@@ -159,6 +119,27 @@ def update_dashboard(metrics_manager):
         logging.error(f"Error updating dashboard: {str(e)}")
         return ("Error", "Error", "Error", go.Figure(), pd.DataFrame(), "Error", "Error")
 
+async def stream_dashboard_updates(metrics_manager):
+    """
+    Yield the dashboard outputs once, then again each time ingestion pushes new data.
+
+    Every browser session runs its own stream; without new data the outputs
+    are still refreshed every IDLE_REFRESH_SECONDS to keep the age current.
+    The first render is timed as the session's first paint.
+    """
+    subscription = metrics_manager.updates.subscribe()
+    try:
+        with instrumentation.span("first_paint", frontend="gradio"):
+            outputs = update_dashboard(metrics_manager)
+        yield outputs
+        while True:
+            if await subscription.wait_async(IDLE_REFRESH_SECONDS):
+                # Several pending updates collapse into one render
+                subscription.drain()
+            yield update_dashboard(metrics_manager)
+    finally:
+        metrics_manager.updates.unsubscribe(subscription)
+
 def create_dashboard():
     # Get configuration
     hf_token = os.getenv("HF_TOKEN")
@@ -169,20 +150,12 @@ def create_dashboard():
 
     # Initialize metrics manager
     metrics_manager = MetricsManager(central_repo, hf_token)
+    metrics_manager.start_background_refresh()
 
     with gr.Blocks(theme=gr.themes.Monochrome()) as dashboard:
         gr.Markdown("# 🧠 Alpha9 Training Dashboard")
         gr.Markdown("Real-time monitoring dashboard for the Alpha9 Bittensor network.")
         
-        # Add refresh interval input
-        refresh_interval = gr.Slider(
-            minimum=1,
-            maximum=60,
-            value=5,
-            step=1,
-            label="Refresh Interval (seconds)"
-        )
-        
         with gr.Row():
             with gr.Column(scale=3):
                 with gr.Group():
@@ -206,6 +179,10 @@ def create_dashboard():
                     last_update = gr.Textbox(label="Last Update")
                     active_jobs = gr.Textbox(label="Active Jobs")
 
+        with gr.Accordion("Status", open=False):
+            status_timings = gr.Dataframe(label="Timings")
+            status_counters = gr.Dataframe(label="Counters")
+
         # Update function
         def update():
             return update_dashboard(metrics_manager)
@@ -218,34 +195,29 @@ def create_dashboard():
                 job_id, active_miners, best_loss,
                 loss_plot,
                 performance_table,
-                last_update, active_jobs
+                last_update, active_jobs,
+                status_timings, status_counters
             ]
         )
 
-        # Auto-refresh using interval
-        interval = gr.Number(value=5, visible=False)  # Hidden interval component
-        
-        def set_interval(value):
-            return value
+        # Live updates: re-render only when ingestion pushes new data
+        async def stream_updates():
+            async for outputs in stream_dashboard_updates(metrics_manager):
+                yield outputs
 
-        refresh_interval.change(
-            fn=set_interval,
-            inputs=[refresh_interval],
-            outputs=[interval]
-        )
-
-        gr.on(
-            triggers=[interval],
-            fn=update,
+        dashboard.load(
+            fn=stream_updates,
             outputs=[
                 job_id, active_miners, best_loss,
                 loss_plot,
                 performance_table,
-                last_update, active_jobs
+                last_update, active_jobs,
+                status_timings, status_counters
             ],
-            every=5
+            concurrency_limit=None
         )
 
+    instrumentation.observe("startup", time.perf_counter() - import_start, phase="dashboard")
     return dashboard
 
 if __name__ == "__main__":
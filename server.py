@@ -0,0 +1,320 @@
+import gzip
+import json
+import logging
+import math
+import os
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, unquote, urlparse
+
+from dotenv import load_dotenv
+
+from utils.Instrumentation import instrumentation
+from utils.MetricsColumns import parse_timestamps
+from utils.MetricsManager import MetricsManager
+
+# Load environment variables and configure logging
+load_dotenv()
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+
+# Number of miners included in each snapshot
+LEADERBOARD_SIZE = 50
+
+# Bodies smaller than this are sent uncompressed
+GZIP_MIN_BYTES = 512
+
+# Idle event streams get a keep-alive comment this often (seconds)
+HEARTBEAT_SECONDS = 15
+
+PROMETHEUS_CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+TEMPLATE_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "templates", "dashboard.html")
+
+class NotFound(Exception):
+    pass
+
+def _clean(value):
+    """
+    Make a value JSON-safe: NaN and infinities become null.
+    """
+    if isinstance(value, float):
+        return value if math.isfinite(value) else None
+    if isinstance(value, dict):
+        return {key: _clean(item) for key, item in value.items()}
+    if isinstance(value, (list, tuple)):
+        return [_clean(item) for item in value]
+    return value
+
+def _resolve(key, lookup):
+    """
+    Map a path segment to an (id, object) pair found by `lookup`; ids are
+    strings or ints depending on what miners submitted.
+    """
+    candidates = [key]
+    try:
+        candidates.append(int(key))
+    except ValueError:
+        pass
+    for candidate in candidates:
+        found = lookup(candidate)
+        if found is not None:
+            return candidate, found
+    raise NotFound(key)
+
+def _snapshot_jobs(manager, repo):
+    """
+    The jobs a full /metrics response covers: each repository's latest job, or
+    the latest jobs of the configured history window.
+    """
+    count = manager.history_window.jobs or 1
+    repo_ids = [repo] if repo is not None else manager.repo_names
+    return {repo_id: manager.repos[repo_id].aggregates.latest_job_ids(count) for repo_id in repo_ids}
+
+def build_payload(manager, path, since, repo=None, offset=0, limit=None):
+    """
+    Build the JSON document served for `path`.
+
+    With `since` (a cursor returned by an earlier response) only entries
+    ingested after it are included; if a full refresh has replaced the stored
+    entries in the meantime the whole set is sent again with `full: true`.
+    A full /metrics response only carries the entries of the latest job (or
+    of the history window); `offset`/`limit` page through all stored entries
+    instead. `repo` restricts it to one monitored repository instead of all of them.
+    """
+    store = manager.store
+    full = since is None or since <= store.reset_cursor(repo)
+    cursor = 0 if full else since
+    # Deeper history is opt-in, and only for full responses: deltas are never paged
+    page = {'offset': offset, 'limit': limit} if full else {}
+    parts = [unquote(part) for part in path.strip('/').split('/')]
+
+    if parts == ['metrics']:
+        if full and not offset and limit is None:
+            entries, cursor = store.entries_after(repo, cursor, jobs=_snapshot_jobs(manager, repo))
+            start = manager.history_window.start_timestamp()
+            if start is not None and entries:
+                inside = parse_timestamps([entry['timestamp'] for entry in entries]) >= start
+                entries = [entry for entry, keep in zip(entries, inside) if keep]
+        else:
+            entries, cursor = store.entries_after(repo, cursor, **page)
+        latest_job = manager.get_job_aggregate(repo=repo)
+        payload = {
+            'latest_job': latest_job.to_dict() if latest_job else None,
+            'top_miners': manager.get_top_miners(LEADERBOARD_SIZE, repo=repo),
+            'leaderboard_size': LEADERBOARD_SIZE,
+        }
+    elif len(parts) == 3 and parts[:2] == ['metrics', 'jobs']:
+        job_id, job = _resolve(parts[2], lambda candidate: manager.get_job_aggregate(candidate, repo))
+        entries, cursor = store.entries_after(repo, cursor, job_id=job_id, **page)
+        payload = {'job': job.to_dict()}
+    elif len(parts) == 3 and parts[:2] == ['metrics', 'miners']:
+        miner_uid, miner = _resolve(parts[2], lambda candidate: manager.get_miner(candidate, repo))
+        entries, cursor = store.entries_after(repo, cursor, miner_uid=miner_uid, **page)
+        payload = {'miner': miner}
+    else:
+        raise NotFound(path)
+
+    return _clean({
+        'version': manager.data_version,
+        'cursor': cursor,
+        'full': full,
+        **payload,
+        'entries': entries,
+    })
+
+def _event_bytes(name, payload):
+    data = json.dumps(_clean(payload), separators=(',', ':'), default=str)
+    return f"event: {name}\nid: {payload['cursor']}\ndata: {data}\n\n".encode('utf-8')
+
+class MetricsRequestHandler(BaseHTTPRequestHandler):
+    """
+    Serves the dashboard page, the JSON metrics API, the live event stream
+    and the instrumentation in the Prometheus text format.
+
+    Every JSON response carries an ETag derived from the data version, so a
+    poll with a matching If-None-Match is answered with an empty 304, and
+    bodies are encoded once per data version and shared by all clients.
+    """
+
+    protocol_version = "HTTP/1.1"
+
+    @property
+    def manager(self):
+        return self.server.manager
+
+    def do_GET(self):
+        url = urlparse(self.path)
+        if url.path in ('/', '/dashboard'):
+            with open(TEMPLATE_PATH, 'rb') as f:
+                return self._send(200, f.read(), 'text/html; charset=utf-8')
+        if url.path == '/prometheus':
+            self.manager.update_gauges()
+            return self._send(200, instrumentation.to_prometheus().encode('utf-8'), PROMETHEUS_CONTENT_TYPE)
+        if url.path != '/events' and not url.path.startswith('/metrics'):
+            return self._send_error(404, "Not found")
+
+        query = parse_qs(url.query)
+        try:
+            since = int(query['since'][0]) if 'since' in query else None
+            # EventSource reconnects resume from the id of the last event received
+            if self.headers.get('Last-Event-ID'):
+                since = int(self.headers['Last-Event-ID'])
+        except ValueError:
+            return self._send_error(400, "since must be an integer cursor")
+        try:
+            offset = int(query['offset'][0]) if 'offset' in query else 0
+            limit = int(query['limit'][0]) if 'limit' in query else None
+            if offset < 0 or (limit is not None and limit < 0):
+                raise ValueError(offset, limit)
+        except ValueError:
+            return self._send_error(400, "offset and limit must be non-negative integers")
+        repo = query['repo'][0] if 'repo' in query else None
+        if repo is not None and repo not in self.manager.repos:
+            return self._send_error(404, "Unknown repository")
+
+        if url.path == '/events':
+            return self._stream_events(since, repo)
+
+        use_gzip = 'gzip' in self.headers.get('Accept-Encoding', '')
+        # The tag is taken before building the body, so a concurrent ingest can
+        # only make it older than the content and never hide new data
+        version = self.manager.data_version
+        etag = f'"{version}-gz"' if use_gzip else f'"{version}"'
+        if etag in self.headers.get('If-None-Match', ''):
+            return self._send(304, b'', etag=etag)
+
+        # A full response covers the history window, which moves with time
+        start = self.manager.history_window.start_timestamp()
+        try:
+            body, encoded = self.manager.cached_query(
+                ('api', url.path, since, repo, offset, limit, start, use_gzip),
+                lambda: self._encode(build_payload(self.manager, url.path, since, repo, offset, limit), use_gzip)
+            )
+        except NotFound:
+            return self._send_error(404, "Not found")
+        except Exception as e:
+            logging.error(f"Error serving {self.path}: {str(e)}")
+            return self._send_error(500, "Internal error")
+        self._send(200, body, 'application/json', etag=etag, gzipped=encoded)
+
+    def _stream_events(self, since, repo):
+        """
+        Server-sent events: a `snapshot` to bring the client up to date, then
+        an `update` per ingest with only the new entries and touched jobs and miners.
+
+        Whenever the client's cursor doesn't line up with an update (it
+        reconnected late or its queue overflowed), a `snapshot` delta from
+        the store closes the gap instead.
+        """
+        # Updates carry one repository's stats, so a stream over several
+        # repositories takes the merged stats from snapshot deltas instead
+        single_repo = repo is not None or len(self.manager.repos) == 1
+        subscription = self.manager.updates.subscribe()
+        self.close_connection = True
+        try:
+            self.send_response(200)
+            self.send_header('Content-Type', 'text/event-stream')
+            self.send_header('Cache-Control', 'no-cache')
+            self.end_headers()
+
+            cursor = since
+            if cursor is None or cursor != self.manager.store.last_id():
+                cursor = self._send_snapshot(cursor, repo)
+            while True:
+                if not subscription.wait(HEARTBEAT_SECONDS):
+                    self._write(b': keep-alive\n\n')
+                    continue
+
+                events, overflowed = subscription.drain()
+                if overflowed:
+                    cursor = self._send_snapshot(cursor, repo)
+                for event in events:
+                    in_sequence = not event['full'] and event['since'] == cursor
+                    if repo is not None and event['repo_id'] != repo:
+                        if in_sequence:
+                            # Nothing for this stream in between
+                            cursor = event['cursor']
+                    elif in_sequence and single_repo:
+                        cursor = self._send_update(event)
+                    elif event['cursor'] > cursor:
+                        # Also covers full refreshes: the cursor is then stale
+                        # and the snapshot carries everything with `full: true`
+                        cursor = self._send_snapshot(cursor, repo)
+        except (BrokenPipeError, ConnectionResetError):
+            pass
+        finally:
+            self.manager.updates.unsubscribe(subscription)
+
+    def _send_snapshot(self, since, repo):
+        """
+        Write the /metrics delta since `since` as a `snapshot` event and return its cursor.
+        """
+        def compute():
+            payload = build_payload(self.manager, '/metrics', since, repo)
+            return payload['cursor'], _event_bytes('snapshot', payload)
+
+        start = self.manager.history_window.start_timestamp()
+        cursor, body = self.manager.cached_query(('snapshot', since, repo, start), compute)
+        self._write(body)
+        return cursor
+
+    def _send_update(self, event):
+        # Encoded once per ingest and shared by every client
+        self._write(self.manager.cached_query(
+            ('update', event['since'], event['cursor']),
+            lambda: _event_bytes('update', event)
+        ))
+        return event['cursor']
+
+    def _write(self, body):
+        self.wfile.write(body)
+        self.wfile.flush()
+
+    @staticmethod
+    def _encode(payload, use_gzip):
+        body = json.dumps(payload, separators=(',', ':'), default=str).encode('utf-8')
+        if use_gzip and len(body) >= GZIP_MIN_BYTES:
+            return gzip.compress(body, compresslevel=6), True
+        return body, False
+
+    def _send_error(self, status, message):
+        self._send(status, json.dumps({'error': message}).encode('utf-8'), 'application/json')
+
+    def _send(self, status, body, content_type=None, etag=None, gzipped=False):
+        self.send_response(status)
+        if content_type:
+            self.send_header('Content-Type', content_type)
+        if etag:
+            self.send_header('ETag', etag)
+            self.send_header('Cache-Control', 'no-cache')
+            self.send_header('Vary', 'Accept-Encoding')
+        if gzipped:
+            self.send_header('Content-Encoding', 'gzip')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        if body:
+            self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        logging.debug(format % args)
+
+def create_server(port=None):
+    # Get configuration
+    hf_token = os.getenv("HF_TOKEN")
+    central_repo = os.getenv("CENTRAL_REPO", "Tobius/yogpt_test")
+
+    if not hf_token:
+        raise ValueError("No Hugging Face token found in environment variables")
+
+    server = ThreadingHTTPServer(("", port or int(os.getenv("PORT", "5002"))), MetricsRequestHandler)
+    server.daemon_threads = True
+    server.manager = MetricsManager(central_repo, hf_token)
+    server.manager.start_background_refresh()
+    return server
+
+if __name__ == "__main__":
+    server = create_server()
+    logging.info(f"Serving metrics API on port {server.server_address[1]}")
+    try:
+        server.serve_forever()
+    finally:
+        server.manager.stop_background_refresh()
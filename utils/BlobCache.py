@@ -0,0 +1,105 @@
+import os
+import threading
+import time
+from collections import OrderedDict
+from typing import Optional, Tuple
+
+class BlobCache:
+    """
+    Size- and age-bounded on-disk cache of repository file contents.
+
+    Files are keyed by their git blob id, so a file that is unchanged across
+    revisions (or copied to another path) is stored once. Blobs not read for
+    `max_age` seconds are dropped, and past `max_bytes` the least recently
+    used blobs are evicted first. Access times are kept in the file mtimes so
+    the LRU order survives restarts.
+    """
+
+    def __init__(self, directory: str, max_bytes: int = 256 * 2**20, max_age: float = 7 * 86400):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.max_age = max_age
+        self._lock = threading.Lock()
+        # blob id -> (size, last access), least recently used first
+        self._index: "OrderedDict[str, Tuple[int, float]]" = OrderedDict()
+        self._total_bytes = 0
+
+        os.makedirs(directory, exist_ok=True)
+        blobs = []
+        for name in os.listdir(directory):
+            path = os.path.join(directory, name)
+            if name.endswith('.tmp'):
+                os.remove(path)  # Left over from an interrupted write
+                continue
+            stat = os.stat(path)
+            blobs.append((stat.st_mtime, name, stat.st_size))
+        for accessed, name, size in sorted(blobs):
+            self._index[name] = (size, accessed)
+            self._total_bytes += size
+        with self._lock:
+            self._evict()
+
+    def __len__(self):
+        return len(self._index)
+
+    @property
+    def total_bytes(self) -> int:
+        return self._total_bytes
+
+    def _path(self, blob_id: str) -> str:
+        return os.path.join(self.directory, blob_id)
+
+    def get(self, blob_id: str) -> Optional[bytes]:
+        with self._lock:
+            if blob_id not in self._index:
+                return None
+            now = time.time()
+            size, accessed = self._index[blob_id]
+            if accessed < now - self.max_age:
+                # Expired since the last eviction, which only runs on writes
+                self._drop(blob_id)
+                return None
+            self._index[blob_id] = (size, now)
+            self._index.move_to_end(blob_id)
+        try:
+            with open(self._path(blob_id), 'rb') as f:
+                content = f.read()
+            os.utime(self._path(blob_id), (now, now))
+            return content
+        except OSError:
+            # Removed behind our back; treat as a miss
+            with self._lock:
+                self._drop(blob_id)
+            return None
+
+    def put(self, blob_id: str, content: bytes):
+        if len(content) > self.max_bytes:
+            return
+        path = self._path(blob_id)
+        temp_path = f"{path}.{threading.get_ident()}.tmp"
+        with open(temp_path, 'wb') as f:
+            f.write(content)
+        os.replace(temp_path, path)
+
+        with self._lock:
+            self._drop(blob_id, remove=False)
+            self._index[blob_id] = (len(content), time.time())
+            self._total_bytes += len(content)
+            self._evict()
+
+    def _drop(self, blob_id: str, remove: bool = True):
+        size, _ = self._index.pop(blob_id, (0, 0))
+        self._total_bytes -= size
+        if remove:
+            try:
+                os.remove(self._path(blob_id))
+            except FileNotFoundError:
+                pass
+
+    def _evict(self):
+        expired_before = time.time() - self.max_age
+        while self._index:
+            blob_id, (_, accessed) = next(iter(self._index.items()))
+            if accessed >= expired_before and self._total_bytes <= self.max_bytes:
+                break
+            self._drop(blob_id)
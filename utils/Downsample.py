@@ -0,0 +1,109 @@
+import math
+from typing import List, Optional, Tuple
+
+import numpy as np
+
+def lttb_indices(x: np.ndarray, y: np.ndarray, threshold: int) -> np.ndarray:
+    """
+    Select `threshold` points with largest-triangle-three-buckets.
+
+    The first and last points are always kept; every bucket in between keeps
+    the point forming the largest triangle with the previously selected point
+    and the average of the next bucket. `x` must be sorted.
+
+    Returns the indices of the selected points.
+    """
+    n = len(x)
+    if threshold >= n or threshold < 3:
+        return np.arange(n)
+
+    every = (n - 2) / (threshold - 2)
+    indices = np.empty(threshold, dtype=np.int64)
+    indices[0] = 0
+    a = 0
+
+    for i in range(threshold - 2):
+        avg_start = int(math.floor((i + 1) * every)) + 1
+        avg_end = min(int(math.floor((i + 2) * every)) + 1, n)
+        avg_x = x[avg_start:avg_end].mean()
+        avg_y = y[avg_start:avg_end].mean()
+
+        start = int(math.floor(i * every)) + 1
+        end = int(math.floor((i + 1) * every)) + 1
+        areas = np.abs(
+            (x[a] - avg_x) * (y[start:end] - y[a])
+            - (x[a] - x[start:end]) * (avg_y - y[a])
+        )
+        a = start + int(np.argmax(areas))
+        indices[i + 1] = a
+
+    indices[-1] = n - 1
+    return indices
+
+def minmax_indices(y: np.ndarray, buckets: int) -> np.ndarray:
+    """
+    Keep the minimum and maximum of each of `buckets` equal-size buckets.
+
+    Cheaper than LTTB and preserves spikes exactly; returns at most
+    2 * `buckets` sorted indices.
+    """
+    n = len(y)
+    if buckets < 1 or 2 * buckets >= n:
+        return np.arange(n)
+
+    size = int(math.ceil(n / buckets))
+    full = n // size
+    body = y[:full * size].reshape(full, size)
+    offsets = np.arange(full) * size
+    selected = [offsets + np.argmin(body, axis=1), offsets + np.argmax(body, axis=1)]
+
+    if full * size < n:
+        tail = y[full * size:]
+        selected.append(np.array([np.argmin(tail), np.argmax(tail)]) + full * size)
+    return np.unique(np.concatenate(selected))
+
+def downsample_indices(x: np.ndarray, y: np.ndarray, max_points: int, method: str = 'lttb') -> np.ndarray:
+    if method == 'lttb':
+        return lttb_indices(x, y, max_points)
+    if method == 'minmax':
+        return minmax_indices(y, max_points // 2)
+    raise ValueError(f"Unknown downsampling method: {method}")
+
+class SeriesPyramid:
+    """
+    A time series pre-aggregated at several resolutions.
+
+    Level 0 holds every point and each following level roughly `factor` times
+    fewer, built with vectorized min/max bucketing from the level before.
+    `select` serves a point budget from the coarsest level that still has
+    enough points in the requested range and only runs LTTB on that slice, so
+    zoomed-out views never touch the full series.
+    """
+
+    def __init__(self, x: np.ndarray, y: np.ndarray, min_points: int = 500, factor: int = 4):
+        self.x = x
+        self.y = y
+        self.levels: List[np.ndarray] = [np.arange(len(x))]
+
+        while len(self.levels[-1]) > min_points * factor:
+            previous = self.levels[-1]
+            reduced = minmax_indices(y[previous], len(previous) // (2 * factor))
+            self.levels.append(previous[reduced])
+
+    def select(self, max_points: int, x_range: Optional[Tuple[float, float]] = None,
+               method: str = 'lttb') -> np.ndarray:
+        """
+        Return at most `max_points` indices into the original series, optionally within `x_range`.
+        """
+        chosen = None
+        for level in reversed(self.levels):
+            if x_range is not None:
+                level_x = self.x[level]
+                level = level[np.searchsorted(level_x, x_range[0], 'left'):np.searchsorted(level_x, x_range[1], 'right')]
+            chosen = level
+            if len(level) >= max_points:
+                break
+
+        if chosen is None or len(chosen) <= max_points:
+            return chosen if chosen is not None else np.arange(0)
+        return chosen[downsample_indices(self.x[chosen], self.y[chosen], max_points, method)]
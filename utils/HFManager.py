@@ -1,78 +1,520 @@
 import json
-from huggingface_hub import HfApi, Repository, hf_hub_download
-from datetime import datetime
-from typing import List, Dict, Optional
+import time
+from concurrent.futures import Executor, ThreadPoolExecutor
+from contextlib import nullcontext
+from huggingface_hub import GitCommitInfo, HfApi, constants, hf_hub_url
+from huggingface_hub.utils import (
+    HfHubHTTPError, build_hf_headers, get_session, hf_raise_for_status, paginate, parse_datetime
+)
+from typing import Callable, Iterable, Iterator, List, Dict, Optional, Set, Tuple
 import os
 
-def fetch_training_metrics_commits(repo_id: str, token: Optional[str] = None) -> List[Dict]:
+from utils.BlobCache import BlobCache
+from utils.HistoryWindow import HistoryWindow
+from utils.Instrumentation import instrumentation
+from utils.MetricsRecord import intern_value
+
+# Number of concurrent Hub requests (tree listings and file downloads) made by
+# a single ingestion run, overridable with HF_FETCH_WORKERS. Lower it if the
+# Hub starts rate limiting.
+DEFAULT_MAX_WORKERS = 8
+
+# Seconds to wait for the Hub when downloading a single metrics file
+DOWNLOAD_TIMEOUT = 30
+
+# Commits whose trees are listed and held at once; bounds the memory of a
+# crawl, which would otherwise grow with commits times files
+TREE_BATCH_SIZE = 64
+
+# Runs in a row a commit's tree may fail to list before the commit is skipped,
+# so one broken commit cannot hold back every newer one
+MAX_TREE_ATTEMPTS = 5
+
+class IngestionState:
+    """
+    Resumable ingestion state for a metrics repository.
+
+    Records the high-water-mark commit of the previous run so the next call to
+    `fetch_training_metrics_commits` only processes commits pushed since then,
+    along with the JSON tree at that commit so the first new commit can be
+    diffed against it. Blob ids already ingested are never downloaded again:
+    those read since the state was last persisted are kept in `seen_blobs`,
+    older ones are looked up through `known_blobs` when the state comes from a
+    store. Files whose download failed are remembered and retried by the next
+    run.
+    """
+
+    def __init__(self, last_commit_id: Optional[str] = None):
+        self.last_commit_id = last_commit_id
+        # path -> blob id of the JSON files at `last_commit_id`
+        self.tree_oids: Dict[str, str] = {}
+        self.seen_blobs: Set[str] = set()
+        # Returns which of the given blob ids earlier, persisted runs ingested
+        self.known_blobs: Optional[Callable[[List[str]], Set[str]]] = None
+        # blob id -> (path, revision) of files that failed to download
+        self.failed_files: Dict[str, Tuple[str, str]] = {}
+        # commit id -> runs in a row its tree failed to list
+        self.tree_failures: Dict[str, int] = {}
+        # True when the last run could not resume from the mark and returned
+        # the full history, so callers must replace their cache, not merge.
+        self.is_full_refresh = last_commit_id is None
+        # Error that aborted the last run, None when it completed
+        self.last_error: Optional[str] = None
+        # Set when the Hub answered 429 during the last run: the Retry-After
+        # delay in seconds, or 0 if none was given
+        self.retry_after: Optional[float] = None
+
+def retry_after_seconds(error: Exception) -> Optional[float]:
+    """
+    Return the Retry-After delay of a rate-limited (429) Hub response.
+
+    Returns 0 when the response carries no usable Retry-After header, and None
+    when the error is not a rate limit at all.
+    """
+    response = getattr(error, "response", None)
+    if not isinstance(error, HfHubHTTPError) or response is None or response.status_code != 429:
+        return None
+    try:
+        return float(response.headers.get("Retry-After", 0))
+    except ValueError:
+        return 0.0
+
+def get_repo_head(repo_id: str, token: Optional[str] = None, api: Optional[HfApi] = None) -> Optional[str]:
+    """
+    Return the commit id the repository's main branch currently points to.
+
+    A single lightweight request, used to skip a crawl when nothing was pushed.
+    """
+    api = api if api is not None else HfApi(token=token)
+    instrumentation.count("hub_requests_total", kind="repo_info")
+    return api.repo_info(repo_id=repo_id).sha
+
+def _note_rate_limit(state: Optional[IngestionState], error: Exception):
+    delay = retry_after_seconds(error)
+    if delay is not None:
+        instrumentation.count("hub_rate_limited_total")
+    if state is not None and delay is not None:
+        state.retry_after = max(state.retry_after or 0.0, delay)
+
+def iter_repo_commits(
+    repo_id: str,
+    token: Optional[str] = None,
+    api: Optional[HfApi] = None
+) -> Iterator[GitCommitInfo]:
+    """
+    Lazily list the commits of the repository's main branch, newest first.
+
+    Unlike `HfApi.list_repo_commits`, which fetches every page up front, a
+    page is only requested once iteration reaches it, so callers that stop at
+    a known commit or a window boundary never list the rest of the history.
+    An injected `api` lists the commits itself instead.
+    """
+    if api is not None:
+        for commit in api.list_repo_commits(repo_id=repo_id):
+            instrumentation.count("hub_commits_listed_total")
+            yield commit
+        return
+    api = HfApi(token=token)
+    for item in paginate(
+        f"{api.endpoint}/api/models/{repo_id}/commits/{constants.DEFAULT_REVISION}",
+        params={},
+        headers=build_hf_headers(token=token)
+    ):
+        instrumentation.count("hub_commits_listed_total")
+        yield GitCommitInfo(
+            commit_id=item["id"],
+            authors=[author["user"] for author in item["authors"]],
+            created_at=parse_datetime(item["date"]),
+            title=item["title"],
+            message=item["message"],
+            formatted_title=None,
+            formatted_message=None
+        )
+
+def _select_new_commits(
+    commits: Iterable,
+    state: Optional[IngestionState],
+    window: Optional[HistoryWindow] = None
+) -> Tuple[List, Optional[str], Optional[GitCommitInfo]]:
+    """
+    Consume newest-first commits up to the state's high-water mark or the window boundary.
+
+    Returns the commits to process, the head commit id, and the newest commit
+    outside the window when the window cut the history short.
+    """
+    resume = state is not None and state.last_commit_id is not None
+    if state is not None:
+        state.is_full_refresh = not resume
+        state.last_error = None
+        state.retry_after = None
+    cutoff = window.commit_cutoff() if window else None
+
+    head = None
+    new_commits = []
+    for commit in commits:
+        if head is None:
+            head = commit.commit_id
+        if resume and commit.commit_id == state.last_commit_id:
+            return new_commits, head, None
+        if window and not window.contains_commit(len(new_commits), commit, cutoff):
+            if resume:
+                # Everything since the mark doesn't fit the window, so start over from the window
+                print(f"Commit {state.last_commit_id} is outside the history window, running windowed ingestion")
+                state.is_full_refresh = True
+            return new_commits, head, commit
+        new_commits.append(commit)
+
+    if resume:
+        # The mark is no longer part of the history (e.g. force push), so resume is
+        # impossible and the whole history has to be ingested again.
+        print(f"Commit {state.last_commit_id} not found in history, running full ingestion")
+        state.is_full_refresh = True
+    return new_commits, head, None
+
+def _changed_json_files(trees: List[List], parent_oids: Dict[str, str]) -> Tuple[List[List], Dict[str, str]]:
+    """
+    Reduce per-commit tree listings to the JSON files each commit added or modified.
+
+    The Hub API does not expose the files touched by a commit, so every listing
+    is diffed by blob id against the previous (older) listing. `trees` holds
+    the JSON files of consecutive commits, oldest first, and `parent_oids` the
+    blob ids of the tree just before them.
+
+    Returns the changed files per commit and the blob ids of the newest tree.
+    """
+    changed = []
+    for json_files in trees:
+        changed.append([f for f in json_files if parent_oids.get(f.path) != f.blob_id])
+        parent_oids = {f.path: f.blob_id for f in json_files}
+    return changed, parent_oids
+
+def _list_json_files(api: HfApi, repo_id: str, revision: str) -> List:
+    """
+    List the metric JSON files present in the repository at a revision.
+    """
+    instrumentation.count("hub_requests_total", kind="list_tree")
+    files = api.list_repo_tree(
+        repo_id=repo_id,
+        revision=revision
+    )
+    return [f for f in files if f.path.endswith('.json')]
+
+def _download_bytes(
+    repo_id: str,
+    filename: str,
+    revision: str,
+    token: Optional[str],
+    api: Optional[HfApi] = None
+) -> bytes:
+    """
+    Download a repository file straight into memory.
+
+    Metrics files are tiny, so unlike `hf_hub_download` nothing is written to
+    the Hugging Face cache directory, unless an injected `api` downloads it.
+    """
+    instrumentation.count("hub_requests_total", kind="download")
+    if api is not None:
+        with open(api.hf_hub_download(repo_id=repo_id, filename=filename, revision=revision), 'rb') as f:
+            content = f.read()
+    else:
+        response = get_session().get(
+            hf_hub_url(repo_id=repo_id, filename=filename, revision=revision),
+            headers=build_hf_headers(token=token),
+            timeout=DOWNLOAD_TIMEOUT
+        )
+        hf_raise_for_status(response)
+        content = response.content
+    instrumentation.count("hub_download_bytes_total", len(content))
+    return content
+
+def _load_metrics_entry(
+    repo_id: str,
+    filename: str,
+    revision: str,
+    token: Optional[str],
+    blob_id: Optional[str] = None,
+    blob_cache: Optional[BlobCache] = None,
+    api: Optional[HfApi] = None
+) -> Optional[Dict]:
+    """
+    Download a single metrics file and turn it into a metrics entry.
+
+    The file is read from `blob_cache` when it holds `blob_id`, and stored
+    there after downloading otherwise.
+
+    Returns None when the file is not a valid miner metrics submission.
+    """
+    content = blob_cache.get(blob_id) if blob_cache is not None else None
+    if blob_cache is not None:
+        instrumentation.count("blob_cache_requests_total", result="hit" if content is not None else "miss")
+    if content is None:
+        content = _download_bytes(repo_id, filename, revision, token, api)
+        if blob_cache is not None:
+            blob_cache.put(blob_id, content)
+
+    try:
+        with instrumentation.span("ingest_phase", phase="parse"):
+            metrics_data = json.loads(content)
+    except ValueError:
+        instrumentation.count("parse_errors_total", reason="invalid_json")
+        raise
+
+    if isinstance(metrics_data, dict) and "metrics" in metrics_data:
+        miner_uid = metrics_data.get("miner_uid")
+        job_id = metrics_data["metrics"].get("job_id")
+
+        if miner_uid and job_id:
+            # Interned, as the same few ids and repo names recur in every entry
+            job_id = intern_value(job_id)
+            metrics_data["metrics"]["job_id"] = job_id
+            return {
+                "model_repo": intern_value(metrics_data.get("model_repo", "unknown")),
+                "metrics": metrics_data["metrics"],
+                "miner_uid": intern_value(miner_uid),
+                "job_id": job_id,
+                "timestamp": metrics_data.get("timestamp", "unknown")
+            }
+    instrumentation.count("parse_errors_total", reason="not_a_submission")
+    return None
+
+def fetch_training_metrics_commits(
+    repo_id: str,
+    token: Optional[str] = None,
+    state: Optional[IngestionState] = None,
+    max_workers: Optional[int] = None,
+    blob_cache: Optional[BlobCache] = None,
+    window: Optional[HistoryWindow] = None,
+    executor: Optional[Executor] = None,
+    api: Optional[HfApi] = None
+) -> List[Dict]:
     """
     Fetch training metrics from a Hugging Face repository.
+
+    When an `IngestionState` is given, only commits newer than its high-water
+    mark are processed and the mark is advanced to the current head. The
+    returned entries are then the new ones only, ordered newest first like a
+    full fetch, so they can be prepended to an existing cache.
+
+    Each commit's tree is diffed against its parent's, and only the JSON files
+    the commit added or modified are downloaded, so the work scales with the
+    number of metric submissions rather than the size of the repository.
+    Files whose blob id was already ingested (under any path or revision) are
+    skipped, and entries of the run sharing a (miner_uid, job_id, timestamp)
+    are collapsed into the first one; keys stored by earlier runs are left to
+    the store to drop.
+
+    Tree listings and file downloads run on a thread pool of at most
+    `max_workers` concurrent requests, or on `executor` when several crawls
+    share one. Trees are listed oldest commit first in batches of
+    TREE_BATCH_SIZE commits, and each batch's changed files are queued for
+    download before its listings are dropped, so memory stays flat however
+    long the history is. Results keep the commit/file order of a sequential
+    crawl. A failing file is skipped on its own and retried by the next run.
+    When a commit's tree cannot be listed, the mark stops at the commit
+    before it and newer commits are left to the next run, so no submission
+    is skipped. After MAX_TREE_ATTEMPTS runs failing on the same commit it is
+    skipped instead; the next commit is diffed against the tree before it,
+    so only files the skipped commit changed and a later one changed again
+    are missed.
+    Files are parsed from memory; pass a `BlobCache` to also keep them on disk.
+
+    Commits are listed lazily and listing stops at the high-water mark, or at
+    the `window` boundary so only its commits are crawled. A windowed crawl
+    diffs its oldest commit against the tree just outside the window, so files
+    from before the window are not ingested.
+
+    Hub requests go to the live Hub unless an `api` client is injected (e.g.
+    the offline stand-in used by the benchmarks), which then lists commits
+    and trees and downloads the files.
     
     Args:
         repo_id (str): The repository ID
         token (Optional[str]): Hugging Face API token
+        state (Optional[IngestionState]): Resumable ingestion state
+        max_workers (Optional[int]): Maximum number of concurrent Hub requests
+        blob_cache (Optional[BlobCache]): On-disk cache of downloaded files
+        window (Optional[HistoryWindow]): Bound on the history crawled
+        executor (Optional[Executor]): Shared pool to run Hub requests on
+        api (Optional[HfApi]): Client to send Hub requests to instead of the live Hub
     """
+    max_workers = max_workers or int(os.getenv("HF_FETCH_WORKERS", DEFAULT_MAX_WORKERS))
     try:
-        api = HfApi(token=token)
-        commits = api.list_repo_commits(repo_id=repo_id)
+        client = api
+        api = client if client is not None else HfApi(token=token)
+        with instrumentation.span("ingest_phase", phase="list_commits"):
+            commits, head, boundary = _select_new_commits(
+                iter_repo_commits(repo_id, token=token, api=client), state, window
+            )
 
         training_metrics = []
         processed_commits = 0
+        downloaded_files = 0
+        skipped_blobs = 0
+        duplicate_records = 0
 
-        print(f"Found {len(commits)} total commits in repository")
+        if state is None or state.is_full_refresh:
+            seen_blobs, retry_files, known_blobs = set(), {}, None
+        else:
+            seen_blobs, retry_files, known_blobs = state.seen_blobs, state.failed_files, state.known_blobs
+        seen_records = set()
+        failed_files = {}
 
-        for commit in commits:
-            try:
-                files = api.list_repo_tree(
-                    repo_id=repo_id, 
-                    revision=commit.commit_id
-                )
-                json_files = [f for f in files if f.path.endswith('.json')]
+        print(f"Found {len(commits)} commits to process" + (" (history window reached)" if boundary else ""))
 
-                for json_file in json_files:
-                    try:
-                        local_path = hf_hub_download(
-                            repo_id=repo_id,
-                            filename=json_file.path,
-                            revision=commit.commit_id,
-                            token=token
-                        )
-
-                        with open(local_path, 'r') as f:
-                            metrics_data = json.loads(f.read())
-
-                        if isinstance(metrics_data, dict) and "metrics" in metrics_data:
-                            miner_uid = metrics_data.get("miner_uid")
-                            job_id = metrics_data["metrics"].get("job_id")
-
-                            if miner_uid and job_id:
-                                metrics_entry = {
-                                    "model_repo": metrics_data.get("model_repo", "unknown"),
-                                    "metrics": metrics_data["metrics"],
-                                    "miner_uid": miner_uid,
-                                    "job_id": job_id,
-                                    "timestamp": metrics_data.get("timestamp", "unknown")
-                                }
-                                training_metrics.append(metrics_entry)
-                                processed_commits += 1
+        start_time = time.monotonic()
+        with nullcontext(executor) if executor is not None else ThreadPoolExecutor(max_workers=max_workers) as executor:
+            # The tree just outside the window is the baseline its oldest commit is diffed against
+            if boundary is not None:
+                boundary_files = executor.submit(_list_json_files, api, repo_id, boundary.commit_id).result()
+                parent_oids = {f.path: f.blob_id for f in boundary_files}
+                mark = boundary.commit_id
+            elif state is None or state.is_full_refresh:
+                parent_oids, mark = {}, None
+            else:
+                parent_oids, mark = state.tree_oids, state.last_commit_id
+
+            # (path, blob id, revision, future) of the queued downloads, per commit oldest first
+            commit_downloads = []
+            pending_blobs = set()
+            oldest_first = commits[::-1]
+            listed_commits = 0
+            # Commits listed or skipped, oldest first; the mark is the last of them
+            handled_commits = 0
+            for batch_start in range(0, len(oldest_first), TREE_BATCH_SIZE):
+                batch = oldest_first[batch_start:batch_start + TREE_BATCH_SIZE]
+                tree_futures = [executor.submit(_list_json_files, api, repo_id, commit.commit_id) for commit in batch]
 
+                listed, trees = [], []
+                handled = None
+                failure = None
+                with instrumentation.span("ingest_phase", phase="list_trees"):
+                    for commit, tree_future in zip(batch, tree_futures):
+                        try:
+                            trees.append(tree_future.result())
+                        except Exception as e:
+                            print(f"Error processing commit {commit.commit_id}: {str(e)}")
+                            instrumentation.count("hub_errors_total", kind="list_tree")
+                            _note_rate_limit(state, e)
+                            if state is None:
+                                failure = (commit, e)
+                                break
+                            attempts = state.tree_failures.pop(commit.commit_id, 0) + 1
+                            if attempts < MAX_TREE_ATTEMPTS:
+                                state.tree_failures[commit.commit_id] = attempts
+                                failure = (commit, e)
+                                break
+                            print(f"Skipping commit {commit.commit_id}, its tree failed to list {attempts} times")
+                            instrumentation.count("ingest_skipped_commits_total")
+                        else:
+                            listed.append(commit)
+                            if state is not None:
+                                state.tree_failures.pop(commit.commit_id, None)
+                        handled = commit
+                with instrumentation.span("ingest_phase", phase="diff_trees"):
+                    changed_files, parent_oids = _changed_json_files(trees, parent_oids)
+
+                # One lookup per batch for the blobs ingested by earlier runs
+                known = known_blobs([f.blob_id for files in changed_files for f in files]) if known_blobs else set()
+                for commit, json_files in zip(listed, changed_files):
+                    downloads = []
+                    for json_file in json_files:
+                        if json_file.blob_id in known or json_file.blob_id in seen_blobs \
+                                or json_file.blob_id in pending_blobs:
+                            skipped_blobs += 1
+                            continue
+                        pending_blobs.add(json_file.blob_id)
+                        downloads.append((
+                            json_file.path, json_file.blob_id, commit.commit_id,
+                            executor.submit(_load_metrics_entry, repo_id, json_file.path, commit.commit_id, token,
+                                            json_file.blob_id, blob_cache, client)
+                        ))
+                    commit_downloads.append(downloads)
+                listed_commits += len(trees)
+                if handled is not None:
+                    mark = handled.commit_id
+                    handled_commits = batch_start + batch.index(handled) + 1
+
+                if failure is not None:
+                    commit, e = failure
+                    for tree_future in tree_futures:
+                        tree_future.cancel()
+                    if not handled_commits:
+                        raise RuntimeError(f"Could not list the tree of commit {commit.commit_id}") from e
+                    # The mark stops before the failed commit, so the next run lists it again
+                    print(f"Stopping at commit {mark}, "
+                          f"{len(commits) - handled_commits} newer commits are left to the next run")
+                    break
+
+            # Retries of previously failed downloads come last
+            retries = []
+            known = known_blobs(list(retry_files)) if known_blobs and retry_files else set()
+            for blob_id, (path, revision) in retry_files.items():
+                if blob_id in known or blob_id in seen_blobs or blob_id in pending_blobs:
+                    skipped_blobs += 1
+                    continue
+                pending_blobs.add(blob_id)
+                retries.append((
+                    path, blob_id, revision,
+                    executor.submit(_load_metrics_entry, repo_id, path, revision, token, blob_id, blob_cache, client)
+                ))
+            instrumentation.count("ingest_retries_total", len(retry_files))
+
+            # Results are read newest commit first, like a sequential crawl
+            file_futures = [download for downloads in reversed(commit_downloads) for download in downloads] + retries
+            with instrumentation.span("ingest_phase", phase="download"):
+                for path, blob_id, revision, file_future in file_futures:
+                    try:
+                        metrics_entry = file_future.result()
+                        downloaded_files += 1
                     except Exception as e:
-                        print(f"Error processing file {json_file.path}: {str(e)}")
+                        print(f"Error processing file {path}: {str(e)}")
+                        instrumentation.count("hub_errors_total", kind="file")
+                        _note_rate_limit(state, e)
+                        failed_files[blob_id] = (path, revision)
                         continue
 
-            except Exception as e:
-                print(f"Error processing commit {commit.commit_id}: {str(e)}")
-                continue
+                    # Only mark the blob once it was read, failed downloads are retried next run
+                    seen_blobs.add(blob_id)
+                    if metrics_entry:
+                        record_key = (metrics_entry["miner_uid"], metrics_entry["job_id"], metrics_entry["timestamp"])
+                        if record_key in seen_records:
+                            duplicate_records += 1
+                            continue
+                        seen_records.add(record_key)
+                        training_metrics.append(metrics_entry)
+                        processed_commits += 1
+
+        elapsed = time.monotonic() - start_time
+        throughput = downloaded_files / elapsed if elapsed > 0 else 0.0
+        print(
+            f"Fetched {downloaded_files} files from {listed_commits} commits in {elapsed:.2f}s "
+            f"({throughput:.1f} files/s, {max_workers} workers), "
+            f"skipped {skipped_blobs} known blobs and {duplicate_records} duplicate records"
+        )
+        instrumentation.count("ingest_commits_total", listed_commits)
+        instrumentation.count("ingest_files_total", downloaded_files)
+        instrumentation.count("ingest_skipped_blobs_total", skipped_blobs)
+        instrumentation.count("ingest_duplicate_records_total", duplicate_records)
 
         filtered_metrics = [
             entry for entry in training_metrics 
             if entry.get('miner_uid') and entry['metrics'].get('job_id')
         ]
 
+        if state is not None and head is not None:
+            state.last_commit_id = mark
+            state.tree_oids = parent_oids
+            state.seen_blobs = seen_blobs
+            state.failed_files = failed_files
+
         print(f"Successfully processed {processed_commits} commits with valid metrics")
         return filtered_metrics
 
     except Exception as e:
         print(f"Error fetching commits: {str(e)}")
+        if state is not None:
+            # Nothing was ingested, keep whatever the caller already has
+            state.is_full_refresh = False
+            state.last_error = str(e)
+            _note_rate_limit(state, e)
         return []
-
@@ -0,0 +1,59 @@
+import time
+from datetime import datetime, timedelta, timezone
+from typing import Optional
+
+# The start of an `hours` window moves in steps this long (seconds), so queries
+# over the window can be cached until it next moves
+START_STEP_SECONDS = 60
+
+class HistoryWindow:
+    """
+    Bound on how much history is ingested and queried.
+
+    `hours` keeps the commits and entries of the last N hours, `commits` the
+    last N commits and `jobs` the entries of the N latest jobs. Job ids are
+    only known once files are downloaded, so `jobs` bounds queries but not the
+    commit crawl. Bounds left as None are unlimited.
+    """
+
+    def __init__(self, hours: Optional[float] = None, commits: Optional[int] = None, jobs: Optional[int] = None):
+        self.hours = hours
+        self.commits = commits
+        self.jobs = jobs
+
+    def __bool__(self):
+        return any(bound is not None for bound in (self.hours, self.commits, self.jobs))
+
+    def __repr__(self):
+        return f"HistoryWindow(hours={self.hours}, commits={self.commits}, jobs={self.jobs})"
+
+    @property
+    def key(self):
+        return (self.hours, self.commits, self.jobs)
+
+    def commit_cutoff(self) -> Optional[datetime]:
+        """
+        Oldest commit date inside the window, None without an `hours` bound.
+        """
+        if self.hours is None:
+            return None
+        return datetime.now(timezone.utc) - timedelta(hours=self.hours)
+
+    def contains_commit(self, position: int, commit, cutoff: Optional[datetime]) -> bool:
+        """
+        Whether the commit at `position` in the newest-first history is inside the window.
+        """
+        if self.commits is not None and position >= self.commits:
+            return False
+        return cutoff is None or commit.created_at >= cutoff
+
+    def start_timestamp(self) -> Optional[float]:
+        """
+        Oldest entry timestamp inside the window, in epoch seconds.
+
+        Rounded down to `START_STEP_SECONDS`, so it only changes once per step.
+        """
+        if self.hours is None:
+            return None
+        start = time.time() - self.hours * 3600
+        return start - start % START_STEP_SECONDS
@@ -0,0 +1,90 @@
+import logging
+import os
+import pickle
+from datetime import datetime
+from typing import Dict, Optional
+
+from utils.MetricsStore import MetricsStore
+from utils.RepoMetrics import RepoMetrics
+
+# Bumped whenever the pickled index classes change shape, so older snapshots are ignored
+SNAPSHOT_FORMAT = 2
+
+class IndexSnapshot:
+    """
+    Pickled copy of every repository's in-memory indexes, for fast warm starts.
+
+    Rebuilding the indexes means decoding every stored entry again; restoring
+    them from the snapshot saved after a refresh only costs unpickling their
+    columns. A snapshot records the store cursor (last entry id) it reflects
+    and how many of each repository's entries were stored up to it. Entries
+    stored after the cursor are replayed on top, and a repository whose
+    entries up to the cursor have changed since (a full refresh replaced
+    them) is left to be rebuilt from the store.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        # When the indexes of the restored snapshot were saved, if one was
+        self.saved_at: Optional[datetime] = None
+
+    def save(self, repos: Dict[str, RepoMetrics], store: MetricsStore):
+        """
+        Write the indexes of `repos`, which must hold everything in `store` and nothing more.
+        """
+        cursor = store.last_id()
+        snapshot = {
+            'format': SNAPSHOT_FORMAT,
+            'saved_at': datetime.now(),
+            'cursor': cursor,
+            'repos': {
+                repo_id: {
+                    'count': store.count(repo_id, cursor),
+                    'indexes': (repo.columns, repo.aggregates, repo.leaderboard),
+                }
+                for repo_id, repo in repos.items()
+            },
+        }
+        if os.path.dirname(self.path):
+            os.makedirs(os.path.dirname(self.path), exist_ok=True)
+        # Written aside and renamed, so a crash mid-write never leaves a torn snapshot
+        tmp_path = f"{self.path}.tmp"
+        with open(tmp_path, 'wb') as f:
+            pickle.dump(snapshot, f, protocol=pickle.HIGHEST_PROTOCOL)
+        os.replace(tmp_path, self.path)
+
+    def restore(self, repos: Dict[str, RepoMetrics], store: MetricsStore) -> Dict[str, int]:
+        """
+        Swap the saved indexes into every repository they are still valid for.
+
+        Returns the cursor after which each restored repository's stored
+        entries still have to be replayed; repositories missing from the
+        result need a full replay.
+        """
+        try:
+            with open(self.path, 'rb') as f:
+                snapshot = pickle.load(f)
+        except FileNotFoundError:
+            return {}
+        except Exception as e:
+            logging.warning(f"Ignoring unreadable index snapshot {self.path}: {str(e)}")
+            return {}
+        if not isinstance(snapshot, dict) or snapshot.get('format') != SNAPSHOT_FORMAT:
+            logging.info(f"Ignoring index snapshot {self.path} of an older format")
+            return {}
+
+        cursor = snapshot['cursor']
+        if cursor > store.last_id():
+            # Saved against another (or a since truncated) store
+            return {}
+
+        restored = {}
+        for repo_id, saved in snapshot['repos'].items():
+            repo = repos.get(repo_id)
+            if repo is None or store.count(repo_id, cursor) != saved['count']:
+                continue
+            repo.columns, repo.aggregates, repo.leaderboard = saved['indexes']
+            restored[repo_id] = cursor
+        if restored:
+            self.saved_at = snapshot['saved_at']
+        return restored
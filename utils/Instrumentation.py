@@ -0,0 +1,150 @@
+import math
+import threading
+import time
+from contextlib import contextmanager
+from typing import Dict, List, Tuple
+
+# Prefix of every exported metric name
+METRIC_PREFIX = "dashboard_"
+
+def _label_key(labels: Dict) -> Tuple:
+    return tuple(sorted((name, str(value)) for name, value in labels.items()))
+
+def _format_labels(label_key: Tuple) -> str:
+    if not label_key:
+        return ""
+    return "{" + ",".join(
+        '{}="{}"'.format(name, value.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n"))
+        for name, value in label_key
+    ) + "}"
+
+def _format_value(value: float) -> str:
+    # Exact, so large byte and request counters do not move in rounded steps
+    value = float(value)
+    if math.isnan(value):
+        return "NaN"
+    if math.isinf(value):
+        return "+Inf" if value > 0 else "-Inf"
+    return str(int(value)) if value.is_integer() else repr(value)
+
+class SpanStats:
+    """
+    Running count, total, last and maximum duration of one timed span.
+    """
+
+    __slots__ = ('count', 'total', 'last', 'max')
+
+    def __init__(self):
+        self.count = 0
+        self.total = 0.0
+        self.last = math.nan
+        self.max = 0.0
+
+    def add(self, seconds: float):
+        self.count += 1
+        self.total += seconds
+        self.last = seconds
+        self.max = max(self.max, seconds)
+
+class Instrumentation:
+    """
+    Process-wide counters, gauges and timing spans of the ingestion and render paths.
+
+    Spans and counters are keyed by name and labels (e.g. the ingestion
+    phase or the frontend), cost a lock and a dict lookup to record, and are
+    exported in the Prometheus text format or as rows for status panels.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._counters: Dict[Tuple[str, Tuple], float] = {}
+        self._gauges: Dict[Tuple[str, Tuple], float] = {}
+        self._spans: Dict[Tuple[str, Tuple], SpanStats] = {}
+
+    def count(self, name: str, value: float = 1, **labels):
+        key = (name, _label_key(labels))
+        with self._lock:
+            self._counters[key] = self._counters.get(key, 0) + value
+
+    def gauge(self, name: str, value: float, **labels):
+        with self._lock:
+            self._gauges[(name, _label_key(labels))] = value
+
+    def observe(self, name: str, seconds: float, **labels):
+        key = (name, _label_key(labels))
+        with self._lock:
+            stats = self._spans.get(key)
+            if stats is None:
+                stats = self._spans[key] = SpanStats()
+            stats.add(seconds)
+
+    @contextmanager
+    def span(self, name: str, **labels):
+        """
+        Time the enclosed block as one `name` span, also when it raises.
+        """
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(name, time.perf_counter() - start, **labels)
+
+    def span_rows(self) -> List[Dict]:
+        """
+        One row per span and label set, for status panels.
+        """
+        with self._lock:
+            spans = [(name, labels, stats.count, stats.total, stats.last, stats.max)
+                     for (name, labels), stats in self._spans.items()]
+        return [
+            {
+                'span': name,
+                'labels': ", ".join(f"{label}={value}" for label, value in labels),
+                'count': count,
+                'mean_ms': total / count * 1000 if count else math.nan,
+                'last_ms': last * 1000,
+                'max_ms': maximum * 1000,
+            }
+            for name, labels, count, total, last, maximum in sorted(spans)
+        ]
+
+    def counter_rows(self) -> List[Dict]:
+        """
+        One row per counter and gauge, for status panels.
+        """
+        with self._lock:
+            values = sorted({**self._counters, **self._gauges}.items())
+        return [
+            {'metric': name, 'labels': ", ".join(f"{label}={value}" for label, value in labels), 'value': value}
+            for (name, labels), value in values
+        ]
+
+    def to_prometheus(self) -> str:
+        """
+        Render everything in the Prometheus text exposition format; spans become summaries.
+        """
+        with self._lock:
+            counters = sorted(self._counters.items())
+            gauges = sorted(self._gauges.items())
+            spans = sorted((key, (stats.count, stats.total)) for key, stats in self._spans.items())
+
+        lines = []
+        typed = set()
+        for kind, samples in (('counter', counters), ('gauge', gauges)):
+            for (name, labels), value in samples:
+                metric = METRIC_PREFIX + name
+                if metric not in typed:
+                    typed.add(metric)
+                    lines.append(f"# TYPE {metric} {kind}")
+                lines.append(f"{metric}{_format_labels(labels)} {_format_value(value)}")
+        for (name, labels), (count, total) in spans:
+            metric = f"{METRIC_PREFIX}{name}_seconds"
+            if metric not in typed:
+                typed.add(metric)
+                lines.append(f"# TYPE {metric} summary")
+            lines.append(f"{metric}_count{_format_labels(labels)} {count}")
+            lines.append(f"{metric}_sum{_format_labels(labels)} {total:.6f}")
+        return "\n".join(lines) + "\n"
+
+# Shared by every module of the process, like the logging root logger
+instrumentation = Instrumentation()
@@ -0,0 +1,112 @@
+import math
+import threading
+from typing import Dict, Iterable, List, Optional
+
+from utils.MetricsRecord import to_float
+
+# Metric reporting how many tokens a submission trained on
+TOKENS_KEY = 'total_tokens'
+
+class JobAggregate:
+    """
+    Running statistics for one training job, updated in O(1) per entry.
+    """
+
+    def __init__(self, job_id):
+        self.job_id = job_id
+        self.submissions = 0
+        self.total_tokens = 0.0
+        self.latest_timestamp = -math.inf
+        self.latest_loss = math.nan
+        self.latest_perplexity = math.nan
+        self.min_loss = math.inf
+        self._tps_sum = 0.0
+        self._tps_count = 0
+
+    @property
+    def mean_tokens_per_second(self) -> float:
+        return self._tps_sum / self._tps_count if self._tps_count else math.nan
+
+    def to_dict(self) -> Dict:
+        """
+        Summary statistics as a plain dict.
+        """
+        return {
+            'job_id': self.job_id,
+            'submissions': self.submissions,
+            'total_tokens': self.total_tokens,
+            'latest_timestamp': self.latest_timestamp,
+            'latest_loss': self.latest_loss,
+            'latest_perplexity': self.latest_perplexity,
+            'min_loss': self.min_loss,
+            'mean_tokens_per_second': self.mean_tokens_per_second,
+        }
+
+    def update(self, metrics: Dict, timestamp: float):
+        self.submissions += 1
+
+        tokens = to_float(metrics.get(TOKENS_KEY))
+        if not math.isnan(tokens):
+            self.total_tokens += tokens
+
+        loss = to_float(metrics.get('final_loss'))
+        if not math.isnan(loss):
+            self.min_loss = min(self.min_loss, loss)
+
+        # Entries don't arrive in time order, so "latest" goes by timestamp
+        if timestamp >= self.latest_timestamp:
+            self.latest_timestamp = timestamp
+            self.latest_loss = loss
+            self.latest_perplexity = to_float(metrics.get('perplexity'))
+
+        tps = to_float(metrics.get('tokens_per_second'))
+        if not math.isnan(tps):
+            self._tps_sum += tps
+            self._tps_count += 1
+
+class JobAggregates:
+    """
+    Per-job aggregates maintained as entries are ingested.
+    """
+
+    def __init__(self):
+        self.jobs: Dict = {}
+        self._lock = threading.Lock()
+
+    def __getstate__(self):
+        state = self.__dict__.copy()
+        del state['_lock']
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self._lock = threading.Lock()
+
+    def update(self, entries: Iterable[Dict], timestamps: Iterable[float]):
+        """
+        Fold ingested entries into their jobs' aggregates.
+
+        `timestamps` holds the parsed epoch seconds of each entry, as returned
+        by `MetricsColumns.extend`.
+        """
+        with self._lock:
+            for entry, timestamp in zip(entries, timestamps):
+                job_id = entry['metrics']['job_id']
+                aggregate = self.jobs.get(job_id)
+                if aggregate is None:
+                    aggregate = self.jobs[job_id] = JobAggregate(job_id)
+                aggregate.update(entry['metrics'], timestamp)
+
+    def latest_job_id(self):
+        with self._lock:
+            return max(self.jobs) if self.jobs else None
+
+    def latest_job_ids(self, n: int) -> List:
+        """
+        The ids of the `n` latest jobs, oldest first.
+        """
+        with self._lock:
+            return sorted(self.jobs)[-n:] if n > 0 else []
+
+    def get(self, job_id) -> Optional[JobAggregate]:
+        return self.jobs.get(job_id)
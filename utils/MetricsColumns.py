@@ -0,0 +1,216 @@
+import math
+import threading
+from array import array
+from typing import TYPE_CHECKING, Dict, Iterable, List, Optional, Tuple
+
+import numpy as np
+
+if TYPE_CHECKING:
+    # Imported by the functions using it, as it dominates import time and a
+    # warm start serves its first page before any DataFrame is built
+    import pandas as pd
+
+from utils.MetricsRecord import MetricsRecord, intern_value, to_float
+
+# Numeric metrics kept as float64 columns, NaN when a submission lacks them
+NUMERIC_COLUMNS = ['final_loss', 'perplexity', 'tokens_per_second', 'inner_lr']
+# String-like fields kept as int32 codes into a per-column value table
+CATEGORY_COLUMNS = ['miner_uid', 'job_id', 'location', 'model_repo']
+
+TIMESTAMP_FORMAT = '%Y%m%d_%H%M%S'
+
+def parse_timestamp(value) -> float:
+    """
+    Parse a single timestamp in any format pandas understands into naive UTC
+    epoch seconds, NaN if unparseable.
+    """
+    import pandas as pd
+    try:
+        parsed = pd.Timestamp(value)
+    except (TypeError, ValueError):
+        return math.nan
+    if parsed is pd.NaT:
+        return math.nan
+    if parsed.tzinfo is not None:
+        parsed = parsed.tz_convert('UTC').tz_localize(None)
+    return parsed.value / 1e9
+
+def parse_timestamps(values: List) -> np.ndarray:
+    """
+    Parse submission timestamps into naive UTC epoch seconds (NaN if unparseable).
+
+    The batch is parsed in one vectorized pass with TIMESTAMP_FORMAT, and only
+    the values that don't match it fall back to `parse_timestamp`.
+    """
+    import pandas as pd
+    parsed = pd.to_datetime(pd.Series(values, dtype=object), format=TIMESTAMP_FORMAT, errors='coerce')
+    seconds = parsed.to_numpy(dtype='datetime64[ns]').astype(np.int64) / 1e9
+    missing = parsed.isna().to_numpy()
+    seconds[missing] = [parse_timestamp(values[i]) for i in np.flatnonzero(missing)]
+    return seconds
+
+class MetricsColumns:
+    """
+    Append-only columnar table of ingested metrics entries.
+
+    Entries are split into typed columns as they are ingested, with the
+    timestamp parsed once, so historical queries are vectorized column copies
+    instead of a Python loop over every entry.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.timestamps = array('d')
+        self.numeric = {name: array('d') for name in NUMERIC_COLUMNS}
+        self.codes = {name: array('i') for name in CATEGORY_COLUMNS}
+        self.categories: Dict[str, List] = {name: [] for name in CATEGORY_COLUMNS}
+        self._category_index: Dict[str, Dict] = {name: {} for name in CATEGORY_COLUMNS}
+
+    def __len__(self):
+        return len(self.timestamps)
+
+    def __getstate__(self):
+        # Locks cannot be pickled; index snapshots get a fresh one on load
+        state = self.__dict__.copy()
+        del state['_lock']
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self._lock = threading.Lock()
+        for values in self.categories.values():
+            values[:] = [intern_value(value) for value in values]
+
+    def _code(self, column: str, value) -> int:
+        index = self._category_index[column]
+        code = index.get(value)
+        if code is None:
+            code = index[value] = len(self.categories[column])
+            self.categories[column].append(intern_value(value))
+        return code
+
+    def extend(self, entries: Iterable[Dict]) -> np.ndarray:
+        """
+        Append metrics entries as produced by `fetch_training_metrics_commits`.
+
+        Returns the parsed epoch-second timestamps of the appended entries.
+        """
+        entries = list(entries)
+        if not entries:
+            return np.empty(0)
+        timestamps = parse_timestamps([entry['timestamp'] for entry in entries])
+
+        with self._lock:
+            self.timestamps.extend(timestamps)
+            for entry in entries:
+                metrics = entry['metrics']
+                for name in NUMERIC_COLUMNS:
+                    self.numeric[name].append(to_float(metrics.get(name)))
+                self.codes['miner_uid'].append(self._code('miner_uid', entry['miner_uid']))
+                self.codes['job_id'].append(self._code('job_id', metrics['job_id']))
+                self.codes['location'].append(self._code('location', entry.get('location', 'Unknown')))
+                self.codes['model_repo'].append(self._code('model_repo', entry.get('model_repo')))
+        return timestamps
+
+    def records(self, job_id=None) -> List[MetricsRecord]:
+        """
+        Rows as `MetricsRecord`s sorted by timestamp, optionally for one job.
+
+        Records share the column's category values, so each distinct miner
+        uid, job id, location and model repo exists once however many rows
+        refer to it.
+        """
+        with self._lock:
+            if job_id is None:
+                rows = range(len(self.timestamps))
+            elif job_id in self._category_index['job_id']:
+                job_codes = np.array(self.codes['job_id'], dtype=np.int32)
+                rows = np.flatnonzero(job_codes == self._category_index['job_id'][job_id]).tolist()
+            else:
+                return []
+
+            codes, values, numeric = self.codes, self.categories, self.numeric
+            records = [
+                MetricsRecord(
+                    values['miner_uid'][codes['miner_uid'][row]],
+                    values['job_id'][codes['job_id'][row]],
+                    self.timestamps[row],
+                    values['model_repo'][codes['model_repo'][row]],
+                    values['location'][codes['location'][row]],
+                    *[numeric[name][row] for name in NUMERIC_COLUMNS]
+                )
+                for row in rows
+            ]
+
+        # Unparseable (NaN) timestamps sort first, like NULLs in the store
+        records.sort(key=lambda record: (not math.isnan(record.timestamp), record.timestamp))
+        return records
+
+    def _sorted_rows(self, start_time: Optional[float], job_ids: Optional[Iterable]) -> np.ndarray:
+        """
+        Indices of the rows matching the filters, in timestamp order (NaN last).
+
+        Must be called with the lock held. The zero-copy views over the arrays
+        are released on return, so the arrays can be extended again.
+        """
+        timestamps = np.frombuffer(self.timestamps, dtype=np.float64)
+        mask = np.ones(len(timestamps), dtype=bool)
+        if start_time is not None:
+            mask &= timestamps >= start_time
+        if job_ids is not None:
+            index = self._category_index['job_id']
+            job_codes = [index[job_id] for job_id in job_ids if job_id in index]
+            mask &= np.isin(np.frombuffer(self.codes['job_id'], dtype=np.intc), job_codes)
+        rows = np.flatnonzero(mask)
+        return rows[np.argsort(timestamps[rows], kind='stable')]
+
+    def trajectory(self, job_id, metric: str) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        Time-sorted (epoch seconds, values) of a numeric column for one job.
+
+        Rows with an unparseable timestamp or a missing value are left out.
+        """
+        with self._lock:
+            rows = self._sorted_rows(None, [job_id])
+            times = np.frombuffer(self.timestamps, dtype=np.float64)[rows]
+            values = np.frombuffer(self.numeric[metric], dtype=np.float64)[rows]
+        keep = ~(np.isnan(times) | np.isnan(values))
+        return times[keep], values[keep]
+
+    def to_frame(self, start_time: Optional[float] = None, job_ids: Optional[Iterable] = None,
+                 offset: int = 0, limit: Optional[int] = None) -> 'pd.DataFrame':
+        """
+        Build the historical metrics DataFrame, sorted by timestamp.
+
+        `start_time` (epoch seconds) and `job_ids` restrict it to a window of
+        history, and `offset`/`limit` select one page of the sorted rows. Only
+        the selected rows are copied out of the columns.
+        """
+        import pandas as pd
+        with self._lock:
+            rows = self._sorted_rows(start_time, job_ids)
+            rows = rows[offset:offset + limit if limit is not None else None]
+            if not len(rows):
+                return pd.DataFrame()
+            # Indexing the temporary views copies, so the arrays can keep
+            # growing after we release the lock
+            timestamps = np.frombuffer(self.timestamps, dtype=np.float64)[rows]
+            numeric = {
+                name: np.frombuffer(self.numeric[name], dtype=np.float64)[rows] for name in NUMERIC_COLUMNS
+            }
+            codes = {
+                name: np.frombuffer(self.codes[name], dtype=np.intc)[rows] for name in CATEGORY_COLUMNS
+            }
+            categories = {
+                name: np.fromiter(self.categories[name], dtype=object, count=len(self.categories[name]))
+                for name in CATEGORY_COLUMNS
+            }
+
+        return pd.DataFrame({
+            'timestamp': pd.to_datetime(timestamps, unit='s'),
+            'miner_uid': categories['miner_uid'].take(codes['miner_uid']),
+            'job_id': categories['job_id'].take(codes['job_id']),
+            **numeric,
+            'location': categories['location'].take(codes['location']),
+            'model_repo': categories['model_repo'].take(codes['model_repo'])
+        }, index=rows)
@@ -0,0 +1,564 @@
+import logging
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import nullcontext
+from datetime import datetime
+
+import numpy as np
+
+from utils.BlobCache import BlobCache
+from utils.Downsample import SeriesPyramid, lttb_indices
+from utils.HFManager import DEFAULT_MAX_WORKERS, fetch_training_metrics_commits, get_repo_head, retry_after_seconds
+from utils.HistoryWindow import HistoryWindow
+from utils.IndexSnapshot import IndexSnapshot
+from utils.Instrumentation import instrumentation
+from utils.MetricsStore import MetricsStore
+from utils.MinerLeaderboard import merge_stats, merged_top_k
+from utils.PollInterval import AdaptivePollInterval
+from utils.QueryCache import QueryCache
+from utils.RepoMetrics import RepoMetrics
+from utils.SamplingProfiler import SamplingProfiler
+from utils.UpdateBroadcaster import UpdateBroadcaster
+
+DEFAULT_STORE_PATH = os.path.join(".cache", "metrics.db")
+DEFAULT_PROFILE_DIR = os.path.join(".cache", "profiles")
+
+class MetricsManager:
+    """
+    Ingests and serves the metrics of one or more repositories.
+
+    `repo_name` is a repository id, a comma-separated list of them or a list.
+    All repositories share one store, one fetch pool and one poll schedule;
+    queries take a `repo` to look at a single repository and cover all of
+    them by default. Hub requests go to `api` when a client is given (e.g.
+    the offline stand-in in benchmarks/), and to the live Hub otherwise.
+    """
+
+    def __init__(self, repo_name, token, store_path=None, api=None):
+        if isinstance(repo_name, str):
+            repo_name = [name.strip() for name in repo_name.split(",") if name.strip()]
+        if not repo_name:
+            raise ValueError("Repository name is required")
+        if not token:
+            raise ValueError("Hugging Face token is required")
+
+        self.repo_names = list(dict.fromkeys(repo_name))
+        self.token = token
+        self.api = api
+        self.last_update = None
+        self.last_refresh_ok = False
+        self.last_error = None
+        # Single-flight guard: only one refresh runs at a time per process
+        self._refresh_lock = threading.Lock()
+        self._refresher = None
+        self._stop_refresher = threading.Event()
+        # One pool for every repository's Hub requests, so monitoring more
+        # repositories never raises the number of concurrent requests
+        self.fetch_workers = int(os.getenv("HF_FETCH_WORKERS", DEFAULT_MAX_WORKERS))
+        self.fetch_pool = ThreadPoolExecutor(max_workers=self.fetch_workers, thread_name_prefix="hf-fetch")
+        self.store = MetricsStore(store_path or os.getenv("METRICS_STORE_PATH", DEFAULT_STORE_PATH))
+        # Downloaded files are parsed in memory unless a disk cache is configured
+        blob_cache_dir = os.getenv("METRICS_BLOB_CACHE_DIR")
+        self.blob_cache = BlobCache(
+            blob_cache_dir,
+            max_bytes=int(float(os.getenv("METRICS_BLOB_CACHE_MB", "256")) * 2**20),
+            max_age=float(os.getenv("METRICS_BLOB_CACHE_DAYS", "7")) * 86400
+        ) if blob_cache_dir else None
+        # Bounds the history that is crawled and shown by default; unset means all of it
+        self.history_window = HistoryWindow(
+            hours=float(os.getenv("HISTORY_HOURS")) if os.getenv("HISTORY_HOURS") else None,
+            commits=int(os.getenv("HISTORY_COMMITS")) if os.getenv("HISTORY_COMMITS") else None,
+            jobs=int(os.getenv("HISTORY_JOBS")) if os.getenv("HISTORY_JOBS") else None
+        )
+        # Resume from the entries and high-water marks persisted by earlier runs,
+        # with in-memory indexes over the stored entries kept up to date at ingest
+        self.repos = {name: RepoMetrics(name, self.store.load_state(name)) for name in self.repo_names}
+        # Indexes saved after refreshes, so a restart does not decode the whole store
+        # again; an empty METRICS_SNAPSHOT_PATH turns them off
+        snapshot_path = os.getenv("METRICS_SNAPSHOT_PATH", f"{self.store.path}.snapshot")
+        self.snapshot = IndexSnapshot(snapshot_path) if snapshot_path else None
+        self.snapshot_interval = float(os.getenv("METRICS_SNAPSHOT_SECONDS", "60"))
+        self._snapshot_due = False
+        self._snapshot_saved = None
+        self._load_indexes()
+        # Query results shared by all viewers until the data version changes
+        self.query_cache = QueryCache(maxsize=int(os.getenv("QUERY_CACHE_SIZE", "64")))
+        # Live updates pushed to subscribed clients after every ingest that changes data
+        self.updates = UpdateBroadcaster(max_queue=int(os.getenv("PUSH_QUEUE_SIZE", "16")))
+        self.update_interval = 60  # seconds
+        # Actual delay between polls, adapted to the repository's activity
+        self.poll_interval = AdaptivePollInterval(
+            initial=self.update_interval,
+            min_interval=float(os.getenv("POLL_MIN_SECONDS", "10")),
+            max_interval=float(os.getenv("POLL_MAX_SECONDS", "600"))
+        )
+        # Opt-in: refreshes slower than this many seconds save a sampled profile
+        self.profile_slow_refresh = (
+            float(os.getenv("PROFILE_SLOW_REFRESH_SECONDS")) if os.getenv("PROFILE_SLOW_REFRESH_SECONDS") else None
+        )
+        self.profile_dir = os.getenv("PROFILE_DIR", DEFAULT_PROFILE_DIR)
+        logging.info(f"MetricsManager initialized for repos: {', '.join(self.repo_names)} "
+                     f"({self.store.count()} stored entries)")
+
+    def _load_indexes(self):
+        """
+        Build the repositories' indexes, from the index snapshot wherever it is still valid.
+
+        Only entries stored after the snapshot are decoded; without a usable
+        snapshot, every stored entry is.
+        """
+        start = time.perf_counter()
+        restored = self.snapshot.restore(self.repos, self.store) if self.snapshot is not None else {}
+        replayed = 0
+        for name, repo in self.repos.items():
+            for entries in self.store.entry_batches(name, cursor=restored.get(name, 0)):
+                repo.apply(entries, reset=False)
+                replayed += len(entries)
+        self._snapshot_due = replayed > 0
+        if restored:
+            # The restored data was current when the snapshot was saved
+            self.last_update = self.snapshot.saved_at
+        elapsed = time.perf_counter() - start
+
+        instrumentation.observe("startup", elapsed, phase="indexes")
+        instrumentation.count("startup_entries_total", self.store.count() - replayed, source="snapshot")
+        instrumentation.count("startup_entries_total", replayed, source="store")
+        logging.info(f"Indexes loaded in {elapsed:.2f}s ({len(restored)}/{len(self.repos)} repos from the "
+                     f"snapshot, {replayed} entries replayed from the store)")
+
+    def _save_snapshot(self):
+        """
+        Save the index snapshot if data changed since the last one and it is due.
+
+        Runs after successful cycles only, when the indexes match the store.
+        At most one snapshot is written per `snapshot_interval` seconds; a
+        restart replays whatever was stored after the last one.
+        """
+        if self.snapshot is None or not self._snapshot_due:
+            return
+        if self._snapshot_saved is not None and time.monotonic() - self._snapshot_saved < self.snapshot_interval:
+            return
+        try:
+            with instrumentation.span("snapshot_save"):
+                self.snapshot.save(self.repos, self.store)
+        except Exception as e:
+            logging.error(f"Error saving index snapshot to {self.snapshot.path}: {str(e)}")
+            return
+        self._snapshot_due = False
+        self._snapshot_saved = time.monotonic()
+
+    def start_background_refresh(self):
+        """
+        Keep the store fresh from a daemon thread instead of the render path.
+
+        Once started, `refresh` no longer fetches inline, so queries always
+        answer immediately from the last completed snapshot.
+        """
+        if self._refresher is not None and self._refresher.is_alive():
+            return
+        self._stop_refresher.clear()
+        self._refresher = threading.Thread(
+            target=self._background_refresh_loop,
+            name="metrics-refresher",
+            daemon=True
+        )
+        self._refresher.start()
+        logging.info(f"Background refresh started (every {self.poll_interval.interval:.0f}s, adaptive)")
+
+    def stop_background_refresh(self):
+        self._stop_refresher.set()
+        if self._refresher is not None:
+            self._refresher.join()
+            self._refresher = None
+
+    def _background_refresh_loop(self):
+        while not self._stop_refresher.is_set():
+            with self._refresh_lock:
+                self.last_refresh_ok = self._fetch()
+            self._stop_refresher.wait(self.poll_interval.interval)
+
+    @property
+    def data_version(self):
+        """Version of the stored data, bumped only when ingestion changes it."""
+        return self.store.version
+
+    def snapshot_age(self):
+        """
+        Seconds since the served snapshot was last refreshed, or None before the first refresh.
+        """
+        if not self.last_update:
+            return None
+        return (datetime.now() - self.last_update).total_seconds()
+
+    def needs_update(self):
+        if not self.last_update:
+            return True
+        return (datetime.now() - self.last_update).total_seconds() > self.poll_interval.interval
+
+    def refresh(self):
+        """
+        Ingest commits pushed since the last run into the store, if due.
+
+        Concurrent callers never start a second fetch: while one is running
+        they return straight away when stored data is available, and otherwise
+        wait for the running fetch and share its outcome.
+        """
+        if self._refresher is not None:
+            # Stale-while-revalidate: the background thread does the fetching
+            return self.last_refresh_ok
+        if not self.needs_update():
+            return True
+
+        if not self._refresh_lock.acquire(blocking=False):
+            if self.store.count():
+                return True
+            with self._refresh_lock:
+                return self.last_refresh_ok
+
+        try:
+            # The fetch we may have raced with could have just finished
+            if not self.needs_update():
+                return True
+            self.last_refresh_ok = self._fetch()
+            return self.last_refresh_ok
+        finally:
+            self._refresh_lock.release()
+
+    def _head_unchanged(self, repo):
+        """
+        Cheap pre-check: True when the repository head is still the last ingested commit.
+        """
+        state = repo.ingestion_state
+        try:
+            head = get_repo_head(repo.repo_id, token=self.token, api=self.api)
+        except Exception as e:
+            state.retry_after = retry_after_seconds(e)
+            raise
+        # Downloads that failed last time still need a crawl to be retried
+        return head == state.last_commit_id and not state.failed_files
+
+    def _fetch(self):
+        """
+        Run one timed ingestion cycle.
+
+        With PROFILE_SLOW_REFRESH_SECONDS set, the cycle runs under a sampling
+        profiler and a slow one leaves its collapsed stacks in `profile_dir`.
+        """
+        profiler = SamplingProfiler() if self.profile_slow_refresh is not None else None
+        start = time.perf_counter()
+        with profiler if profiler is not None else nullcontext():
+            ok = self._fetch_repos()
+        elapsed = time.perf_counter() - start
+        instrumentation.observe("refresh", elapsed)
+        instrumentation.count("refreshes_total", result="ok" if ok else "error")
+
+        if profiler is not None and elapsed >= self.profile_slow_refresh:
+            path = os.path.join(self.profile_dir, f"refresh-{datetime.now():%Y%m%d-%H%M%S}.folded")
+            try:
+                profiler.write(path)
+            except Exception as e:
+                logging.error(f"Error saving refresh profile to {path}: {str(e)}")
+            else:
+                logging.warning(f"Refresh took {elapsed:.1f}s, profile saved to {path}")
+        return ok
+
+    def _fetch_repos(self):
+        """
+        Run one ingestion cycle over every monitored repository.
+
+        Repositories are crawled one after another on the shared fetch pool.
+        They also share the Hub's rate limit: once one is rate limited, the
+        rest wait for the next cycle instead of adding to the backoff.
+        """
+        changed = False
+        errors = []
+        retry_after = None
+        for repo in self.repos.values():
+            repo.ingestion_state.retry_after = None
+            try:
+                changed = self._fetch_repo(repo) or changed
+            except Exception as e:
+                errors.append(f"{repo.repo_id}: {str(e)}")
+                logging.error(f"Error fetching metrics for {repo.repo_id}: {str(e)}")
+            if repo.ingestion_state.retry_after is not None:
+                retry_after = repo.ingestion_state.retry_after
+                break
+
+        if retry_after is not None:
+            self.poll_interval.on_rate_limited(retry_after)
+        elif changed:
+            self.poll_interval.on_change()
+        elif not errors:
+            self.poll_interval.on_idle()
+            logging.info(f"No new commits, next check in {self.poll_interval.interval:.0f}s")
+
+        self._snapshot_due = self._snapshot_due or changed
+        if errors or retry_after is not None:
+            # The stored entries of the failed repositories are left untouched,
+            # so their previous snapshot keeps being served
+            self.last_error = "; ".join(errors) or f"Rate limited, retrying in {retry_after:.0f}s"
+            return False
+        self.last_update = datetime.now()
+        self.last_error = None
+        self._save_snapshot()
+        return True
+
+    def _fetch_repo(self, repo):
+        """
+        Ingest the commits pushed to one repository since its last run.
+
+        Returns whether the repository had new commits.
+        """
+        if self._head_unchanged(repo):
+            return False
+
+        logging.info(f"Fetching fresh metrics for {repo.repo_id} from HuggingFace...")
+        state = repo.ingestion_state
+        with instrumentation.span("ingest", repo=repo.repo_id):
+            new_entries = fetch_training_metrics_commits(
+                repo.repo_id,
+                token=self.token,
+                state=state,
+                max_workers=self.fetch_workers,
+                blob_cache=self.blob_cache,
+                window=self.history_window,
+                executor=self.fetch_pool,
+                api=self.api
+            )
+        if state.last_error:
+            raise RuntimeError(state.last_error)
+
+        # The indexes only get the entries the store inserted, and before it
+        # bumps the data version, so a result cached under the new version
+        # always includes them
+        def index(inserted):
+            with instrumentation.span("ingest_phase", phase="index"):
+                repo.apply(inserted, reset=state.is_full_refresh)
+
+        since = self.store.last_id()
+        with instrumentation.span("ingest_phase", phase="store"):
+            added = self.store.save_batch(repo.repo_id, new_entries, state, on_insert=index)
+        instrumentation.count("ingest_duplicate_records_total", len(new_entries) - added)
+        if added or state.is_full_refresh:
+            self._publish_update(repo, since, full=state.is_full_refresh)
+        logging.info(f"Fetched {added} new metrics entries for {repo.repo_id} "
+                     f"({self.store.count(repo.repo_id)} total)")
+        return True
+
+    def _publish_update(self, repo, since, full):
+        """
+        Push the entries stored after cursor `since`, with the jobs and miners they touched.
+
+        Clients holding cursor `since` apply the update as a delta; `full`
+        means the repository's entries were replaced and clients must start over.
+        """
+        entries, cursor = self.store.entries_after(repo.repo_id, since)
+        job_ids = {entry['metrics']['job_id'] for entry in entries}
+        miner_uids = {entry['miner_uid'] for entry in entries}
+        self.updates.publish({
+            'version': self.data_version,
+            'repo_id': repo.repo_id,
+            'since': since,
+            'cursor': cursor,
+            'full': full,
+            'entries': entries,
+            'jobs': [repo.aggregates.get(job_id).to_dict() for job_id in job_ids],
+            'miners': [repo.leaderboard.get(miner_uid) for miner_uid in miner_uids],
+        })
+
+    def cached_query(self, key, compute):
+        """
+        Return `compute()` memoized for the current data version.
+
+        Used for anything derived from the stored metrics (DataFrames, tables,
+        figures) so it is built once per data change and shared by every
+        viewer. The returned value must not be mutated.
+        """
+        name = key[0] if isinstance(key, tuple) else key
+
+        def timed_compute():
+            with instrumentation.span("query", query=name):
+                return compute()
+
+        return self.query_cache.get_or_compute(key, self.data_version, timed_compute)
+
+    def update_gauges(self):
+        """
+        Record the current state of the store, caches and subscribers as instrumentation gauges.
+        """
+        instrumentation.gauge("stored_entries", self.store.count())
+        instrumentation.gauge("data_version", self.data_version)
+        instrumentation.gauge("poll_interval_seconds", self.poll_interval.interval)
+        instrumentation.gauge("snapshot_age_seconds", self.snapshot_age() or 0)
+        instrumentation.gauge("update_subscribers", len(self.updates))
+        instrumentation.gauge("query_cache_hits", self.query_cache.hits)
+        instrumentation.gauge("query_cache_misses", self.query_cache.misses)
+        if self.blob_cache is not None:
+            instrumentation.gauge("blob_cache_bytes", self.blob_cache.total_bytes)
+
+    def _scope(self, repo):
+        """
+        The monitored repositories a query covers: `repo` alone, or all of them.
+        """
+        if repo is None:
+            return list(self.repos.values())
+        if repo not in self.repos:
+            raise ValueError(f"Repository {repo} is not monitored")
+        return [self.repos[repo]]
+
+    def _find_job(self, job_id, repo):
+        """
+        The repository holding `job_id` (the latest job by default) and the job id, or (None, None).
+        """
+        candidates = []
+        for scoped in self._scope(repo):
+            if job_id is None:
+                latest = scoped.aggregates.latest_job_id()
+                if latest is not None:
+                    candidates.append((latest, scoped))
+            elif scoped.aggregates.get(job_id) is not None:
+                return scoped, job_id
+        if not candidates:
+            return None, None
+        # Get the latest job (assuming job_ids are timestamp-based or sequential)
+        latest, scoped = max(candidates, key=lambda candidate: candidate[0])
+        return scoped, latest
+
+    def get_latest_job_metrics(self, repo=None):
+        """
+        `MetricsRecord`s of the latest job in timestamp order, or None before any data.
+        """
+        self.refresh()
+        return self.cached_query(('latest_job_metrics', repo), lambda: self._query_latest_job_metrics(repo))
+
+    def _query_latest_job_metrics(self, repo):
+        scoped, latest_job_id = self._find_job(None, repo)
+        if scoped is None:
+            return None
+        return scoped.columns.records(job_id=latest_job_id)
+
+    def get_historical_metrics(self, window=None, offset=0, limit=None, repo=None):
+        """
+        Historical metrics DataFrame sorted by timestamp, with the `repo_id` of each row.
+
+        Only the configured history window is included unless another
+        `HistoryWindow` is given (an empty one means all history), and
+        `offset`/`limit` page through the rows.
+        """
+        self.refresh()
+        window = self.history_window if window is None else window
+        # The data version does not move while the repository is idle, but an
+        # `hours` window does, so its current start is part of the key
+        start = window.start_timestamp()
+        return self.cached_query(('historical_metrics', window.key, start, offset, limit, repo),
+                                 lambda: self._query_historical_metrics(window, start, offset, limit, repo))
+
+    def _query_historical_metrics(self, window, start, offset, limit, repo):
+        import pandas as pd
+        scope = self._scope(repo)
+        if len(scope) == 1:
+            return self._repo_frame(scope[0], window, start, offset, limit)
+        # The merged page is cut from each repository's first offset + limit rows
+        end = offset + limit if limit is not None else None
+        frames = [self._repo_frame(scoped, window, start, 0, end) for scoped in scope]
+        frames = [frame for frame in frames if not frame.empty]
+        if not frames:
+            return pd.DataFrame()
+        # Row labels are only unique within a repository
+        df = pd.concat(frames, ignore_index=True).sort_values('timestamp', kind='stable')
+        return df.iloc[offset:end]
+
+    def _repo_frame(self, repo, window, start, offset, limit):
+        job_ids = repo.aggregates.latest_job_ids(window.jobs) if window.jobs is not None else None
+        # Timestamps were parsed at ingest; unparseable ones are NaT
+        df = repo.columns.to_frame(start_time=start, job_ids=job_ids,
+                                   offset=offset, limit=limit)
+        if not df.empty:
+            df.insert(0, 'repo_id', repo.repo_id)
+        return df
+
+    def get_chart_series(self, column, max_points, x_range=None, method='lttb', repo=None):
+        """
+        Historical values of `column` over time, downsampled to at most `max_points`.
+
+        The series is pre-aggregated at several resolutions once per data
+        version; `x_range` (a pair of timestamps) restricts the points to a
+        zoomed-in window.
+        """
+        # Built over the history window, so keyed by its start like the historical frame
+        start = self.history_window.start_timestamp()
+        series, pyramid = self.cached_query(('series_pyramid', column, repo, start),
+                                            lambda: self._build_series_pyramid(column, repo))
+        if x_range is not None:
+            import pandas as pd
+            x_range = tuple(pd.Timestamp(bound).value for bound in x_range)
+            return series.iloc[pyramid.select(max_points, x_range, method)]
+        return self.cached_query(
+            ('chart_series', column, max_points, method, repo, start),
+            lambda: series.iloc[pyramid.select(max_points, method=method)]
+        )
+
+    def get_top_miners(self, k, by='best_loss', repo=None):
+        """
+        The `k` best miners across all jobs for a ranking ('best_loss', 'hashrate' or 'submissions').
+
+        Across several repositories each miner's stats are combined before ranking.
+        """
+        self.refresh()
+        scope = self._scope(repo)
+        if len(scope) == 1:
+            return self.cached_query(('top_miners', k, by, repo), lambda: scope[0].leaderboard.top_k(k, by))
+        return self.cached_query(('top_miners', k, by, repo),
+                                 lambda: merged_top_k([scoped.leaderboard for scoped in scope], k, by))
+
+    def get_miner(self, miner_uid, repo=None):
+        """
+        Cross-job statistics of a miner as a dict, or None if it never submitted.
+        """
+        self.refresh()
+        stats = [scoped.leaderboard.get(miner_uid) for scoped in self._scope(repo)]
+        stats = [miner for miner in stats if miner is not None]
+        return merge_stats(stats) if stats else None
+
+    def get_job_aggregate(self, job_id=None, repo=None):
+        """
+        Running statistics of a job (the latest one by default), or None.
+        """
+        self.refresh()
+        scoped, job_id = self._find_job(job_id, repo)
+        return scoped.aggregates.get(job_id) if scoped is not None else None
+
+    def get_job_trajectory(self, metric, max_points, job_id=None, repo=None):
+        """
+        Time series of `metric` for a job (the latest one by default), downsampled to `max_points`.
+        """
+        self.refresh()
+        scoped, job_id = self._find_job(job_id, repo)
+        repo_id = scoped.repo_id if scoped is not None else None
+        return self.cached_query(('job_trajectory', repo_id, job_id, metric, max_points),
+                                 lambda: self._build_job_trajectory(scoped, job_id, metric, max_points))
+
+    def _build_job_trajectory(self, repo, job_id, metric, max_points):
+        import pandas as pd
+        if repo is None:
+            times, values = np.empty(0), np.empty(0)
+        else:
+            times, values = repo.columns.trajectory(job_id, metric)
+        keep = lttb_indices(times, values, max_points)
+        return pd.DataFrame({
+            'timestamp': pd.to_datetime(times[keep], unit='s'),
+            metric: values[keep]
+        })
+
+    def _build_series_pyramid(self, column, repo):
+        import pandas as pd
+        df = self.get_historical_metrics(repo=repo)
+        if df.empty:
+            series = pd.DataFrame(columns=['timestamp', 'miner_uid', column])
+        else:
+            series = df[['timestamp', 'miner_uid', column]].dropna(subset=['timestamp', column])
+        x = series['timestamp'].to_numpy(dtype='datetime64[ns]').astype(np.int64).astype(np.float64)
+        y = series[column].to_numpy(dtype=np.float64)
+        return series, SeriesPyramid(x, y)
@@ -0,0 +1,49 @@
+import math
+import sys
+from typing import Dict
+
+def intern_value(value):
+    """
+    Intern strings so equal ids and repo names share one object; other values pass through.
+    """
+    return sys.intern(value) if type(value) is str else value
+
+def to_float(value, default=math.nan):
+    """
+    Convert a metric value to float, `default` when it is missing or not numeric.
+    """
+    try:
+        return float(value) if value is not None else default
+    except (TypeError, ValueError):
+        return default
+
+class MetricsRecord:
+    """
+    Compact, read-only view of one ingested metrics entry.
+
+    Takes a fraction of the memory of the entry dict it replaces: fields are
+    slots instead of a per-entry dict, repeated strings are shared, and the
+    timestamp is already parsed to epoch seconds.
+    """
+
+    __slots__ = ('miner_uid', 'job_id', 'timestamp', 'model_repo', 'location',
+                 'final_loss', 'perplexity', 'tokens_per_second', 'inner_lr')
+
+    def __init__(self, miner_uid, job_id, timestamp: float, model_repo, location,
+                 final_loss: float = math.nan, perplexity: float = math.nan,
+                 tokens_per_second: float = math.nan, inner_lr: float = math.nan):
+        self.miner_uid = miner_uid
+        self.job_id = job_id
+        self.timestamp = timestamp
+        self.model_repo = model_repo
+        self.location = location
+        self.final_loss = final_loss
+        self.perplexity = perplexity
+        self.tokens_per_second = tokens_per_second
+        self.inner_lr = inner_lr
+
+    def __repr__(self):
+        return f"MetricsRecord(miner_uid={self.miner_uid!r}, job_id={self.job_id!r}, timestamp={self.timestamp!r})"
+
+    def to_dict(self) -> Dict:
+        return {name: getattr(self, name) for name in self.__slots__}
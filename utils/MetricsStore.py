@@ -0,0 +1,314 @@
+import json
+import os
+import sqlite3
+import threading
+from functools import partial
+from typing import Callable, Dict, Iterable, Iterator, List, Optional, Set, Tuple
+
+from utils.HFManager import IngestionState
+from utils.MetricsRecord import to_float
+
+# Metric values copied out of the raw entry into their own columns so they
+# can be queried without parsing the stored JSON.
+METRIC_COLUMNS = ['final_loss', 'perplexity', 'tokens_per_second', 'inner_lr', 'hashrate']
+
+# Prefix of the `meta` keys holding each repository's reset cursor
+RESET_CURSOR_KEY = 'reset_cursor:'
+
+# Blob ids looked up per query, below SQLite's limit on bound parameters
+BLOB_LOOKUP_SIZE = 500
+
+# miner_uid, job_id and timestamp are declared without a type so SQLite keeps
+# the values exactly as they appear in the metrics files (int or str).
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS entries (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    repo_id TEXT NOT NULL,
+    miner_uid,
+    job_id,
+    timestamp,
+    model_repo TEXT,
+    location TEXT,
+    final_loss REAL,
+    perplexity REAL,
+    tokens_per_second REAL,
+    inner_lr REAL,
+    hashrate REAL,
+    entry TEXT NOT NULL,
+    UNIQUE (repo_id, miner_uid, job_id, timestamp)
+);
+CREATE INDEX IF NOT EXISTS idx_entries_job_id ON entries (repo_id, job_id);
+CREATE INDEX IF NOT EXISTS idx_entries_miner_uid ON entries (repo_id, miner_uid);
+CREATE INDEX IF NOT EXISTS idx_entries_timestamp ON entries (repo_id, timestamp);
+CREATE TABLE IF NOT EXISTS ingestion_state (
+    repo_id TEXT PRIMARY KEY,
+    last_commit_id TEXT,
+    tree_oids TEXT NOT NULL
+);
+CREATE TABLE IF NOT EXISTS seen_blobs (
+    repo_id TEXT NOT NULL,
+    blob_id TEXT NOT NULL,
+    PRIMARY KEY (repo_id, blob_id)
+);
+CREATE TABLE IF NOT EXISTS failed_files (
+    repo_id TEXT NOT NULL,
+    blob_id TEXT NOT NULL,
+    path TEXT NOT NULL,
+    revision TEXT NOT NULL,
+    PRIMARY KEY (repo_id, blob_id)
+);
+CREATE TABLE IF NOT EXISTS meta (
+    key TEXT PRIMARY KEY,
+    value INTEGER NOT NULL
+);
+"""
+
+class MetricsStore:
+    """
+    Persistent SQLite store for ingested metrics entries.
+
+    Holds the entries of every monitored repository together with the
+    `IngestionState` that produced them, so a restarted process resumes
+    ingestion from its high-water mark instead of re-crawling the repository,
+    and still retries the downloads that failed before the restart.
+
+    Ingested blob ids and entry keys are deduplicated here rather than in
+    memory: the state looks blobs up in `seen_blobs`, and entries whose
+    (miner_uid, job_id, timestamp) is already stored are dropped on insert.
+    """
+
+    def __init__(self, path: str):
+        if os.path.dirname(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+
+        self.path = path
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.executescript(SCHEMA)
+
+        meta = dict(self._conn.execute("SELECT key, value FROM meta"))
+        # Counter bumped every time stored entries change, mirrored in `meta`
+        self.version = meta.get('version', 0)
+        # repo id -> last entry id when a full refresh replaced its entries, mirrored in `meta`
+        self._reset_cursors = {
+            key[len(RESET_CURSOR_KEY):]: value for key, value in meta.items() if key.startswith(RESET_CURSOR_KEY)
+        }
+
+    def reset_cursor(self, repo_id: Optional[str] = None) -> int:
+        """
+        Cursor at or below which a client's view of the repository (of any, without `repo_id`) is stale.
+
+        It is the last entry id when a full refresh last replaced the
+        repository's stored entries, so refreshing one repository leaves the
+        cursors of the others valid.
+        """
+        if repo_id is not None:
+            return self._reset_cursors.get(repo_id, 0)
+        return max(self._reset_cursors.values(), default=0)
+
+    def load_state(self, repo_id: str) -> IngestionState:
+        """
+        Rebuild the ingestion state persisted for a repository.
+        """
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT last_commit_id, tree_oids FROM ingestion_state WHERE repo_id = ?",
+                (repo_id,)
+            ).fetchone()
+            failed_files = {
+                blob_id: (path, revision)
+                for blob_id, path, revision in self._conn.execute(
+                    "SELECT blob_id, path, revision FROM failed_files WHERE repo_id = ?", (repo_id,)
+                )
+            }
+
+        state = IngestionState(last_commit_id=row[0]) if row else IngestionState()
+        state.known_blobs = partial(self.known_blobs, repo_id)
+        if row:
+            state.tree_oids = json.loads(row[1])
+            state.failed_files = failed_files
+        return state
+
+    def known_blobs(self, repo_id: str, blob_ids: Iterable[str]) -> Set[str]:
+        """
+        The subset of `blob_ids` ingested into the repository by earlier runs.
+        """
+        blob_ids = list(blob_ids)
+        known = set()
+        with self._lock:
+            for start in range(0, len(blob_ids), BLOB_LOOKUP_SIZE):
+                chunk = blob_ids[start:start + BLOB_LOOKUP_SIZE]
+                known.update(blob_id for (blob_id,) in self._conn.execute(
+                    f"SELECT blob_id FROM seen_blobs WHERE repo_id = ? AND blob_id IN ({', '.join('?' * len(chunk))})",
+                    (repo_id, *chunk)
+                ))
+        return known
+
+    def save_batch(self, repo_id: str, entries: List[Dict], state: IngestionState,
+                   on_insert: Optional[Callable[[List[Dict]], None]] = None) -> int:
+        """
+        Persist the entries of one ingestion run along with the updated state.
+
+        A full refresh replaces everything stored for the repository. Entries
+        whose key is already stored are dropped; `on_insert` is called with the
+        others before the data version moves, so in-memory indexes fed from it
+        are current for anything cached under the new version. The blob ids of
+        `state.seen_blobs` move to the store. Returns the number of entries added.
+        """
+        rows = [
+            (
+                repo_id,
+                entry['miner_uid'],
+                entry['job_id'],
+                entry['timestamp'],
+                entry.get('model_repo'),
+                entry.get('location'),
+                *[to_float(entry['metrics'].get(column), None) for column in METRIC_COLUMNS],
+                json.dumps(entry)
+            )
+            for entry in entries
+        ]
+
+        with self._lock, self._conn:
+            changed = 0
+            reset_cursor = None
+            if state.is_full_refresh:
+                last_id = self._conn.execute("SELECT COALESCE(MAX(id), 0) FROM entries").fetchone()[0]
+                deleted = self._conn.execute("DELETE FROM entries WHERE repo_id = ?", (repo_id,)).rowcount
+                self._conn.execute("DELETE FROM seen_blobs WHERE repo_id = ?", (repo_id,))
+                changed += deleted
+                # A first ingest replaces nothing, so no client holds entries it could invalidate
+                if deleted:
+                    reset_cursor = last_id
+                    self._conn.execute(
+                        "INSERT OR REPLACE INTO meta (key, value) VALUES (?, ?)",
+                        (RESET_CURSOR_KEY + repo_id, reset_cursor)
+                    )
+
+            inserted = []
+            for entry, row in zip(entries, rows):
+                if self._conn.execute(
+                    "INSERT OR IGNORE INTO entries (repo_id, miner_uid, job_id, timestamp, model_repo, location, "
+                    "final_loss, perplexity, tokens_per_second, inner_lr, hashrate, entry) "
+                    "VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                    row
+                ).rowcount:
+                    inserted.append(entry)
+            added = len(inserted)
+            changed += added
+            if on_insert is not None:
+                on_insert(inserted)
+
+            self._conn.executemany(
+                "INSERT OR IGNORE INTO seen_blobs (repo_id, blob_id) VALUES (?, ?)",
+                [(repo_id, blob_id) for blob_id in state.seen_blobs]
+            )
+
+            self._conn.execute(
+                "INSERT OR REPLACE INTO ingestion_state (repo_id, last_commit_id, tree_oids) VALUES (?, ?, ?)",
+                (repo_id, state.last_commit_id, json.dumps(state.tree_oids))
+            )
+            # Pending retries are few, so they are rewritten whole every run
+            self._conn.execute("DELETE FROM failed_files WHERE repo_id = ?", (repo_id,))
+            self._conn.executemany(
+                "INSERT INTO failed_files (repo_id, blob_id, path, revision) VALUES (?, ?, ?, ?)",
+                [(repo_id, blob_id, path, revision) for blob_id, (path, revision) in state.failed_files.items()]
+            )
+            if changed:
+                self._conn.execute(
+                    "INSERT OR REPLACE INTO meta (key, value) VALUES ('version', ?)",
+                    (self.version + 1,)
+                )
+        if reset_cursor is not None:
+            self._reset_cursors[repo_id] = reset_cursor
+        state.seen_blobs = set()
+        if changed:
+            self.version += 1
+        return added
+
+    def count(self, repo_id: Optional[str] = None, cursor: Optional[int] = None) -> int:
+        """
+        Number of stored entries of a repository, or of all repositories.
+
+        With a `cursor`, only entries stored up to that entry id are counted.
+        """
+        conditions, params = [], []
+        if repo_id is not None:
+            conditions.append("repo_id = ?")
+            params.append(repo_id)
+        if cursor is not None:
+            conditions.append("id <= ?")
+            params.append(cursor)
+        query = "SELECT COUNT(*) FROM entries"
+        if conditions:
+            query += " WHERE " + " AND ".join(conditions)
+
+        with self._lock:
+            return self._conn.execute(query, params).fetchone()[0]
+
+    def last_id(self) -> int:
+        """
+        Id of the most recently stored entry, i.e. the cursor of the whole table.
+        """
+        with self._lock:
+            return self._conn.execute("SELECT COALESCE(MAX(id), 0) FROM entries").fetchone()[0]
+
+    def entry_batches(self, repo_id: str, batch_size: int = 10000, cursor: int = 0) -> Iterator[List[Dict]]:
+        """
+        Yield every entry stored after `cursor` in insertion order, `batch_size` at a time.
+
+        Lets callers fold a large store into their indexes without decoding
+        all of it into memory at once.
+        """
+        while True:
+            with self._lock:
+                rows = self._conn.execute(
+                    "SELECT id, entry FROM entries WHERE repo_id = ? AND id > ? ORDER BY id LIMIT ?",
+                    (repo_id, cursor, batch_size)
+                ).fetchall()
+            if not rows:
+                return
+            cursor = rows[-1][0]
+            yield [json.loads(entry) for _, entry in rows]
+
+    def entries_after(self, repo_id: Optional[str], cursor: int = 0, job_id=None, miner_uid=None,
+                      jobs: Optional[Dict[str, List]] = None, offset: int = 0,
+                      limit: Optional[int] = None) -> Tuple[List[Dict], int]:
+        """
+        Return entries stored after `cursor` in insertion order, plus the new cursor.
+
+        Cursors are entry ids shared by all repositories, so a client passing
+        back the returned cursor only receives entries ingested since its
+        previous call. A `repo_id` of None returns every repository's entries;
+        each entry is tagged with its `repo_id`. `jobs` (repo id -> job ids)
+        keeps only those jobs of each repository, and `offset`/`limit` select
+        one page of the matching entries; the cursor is still the table's end.
+        """
+        query = "SELECT repo_id, entry FROM entries WHERE id > ?"
+        params = [cursor]
+        if repo_id is not None:
+            query += " AND repo_id = ?"
+            params.append(repo_id)
+        if job_id is not None:
+            query += " AND job_id = ?"
+            params.append(job_id)
+        if miner_uid is not None:
+            query += " AND miner_uid = ?"
+            params.append(miner_uid)
+        if jobs is not None:
+            scoped = [(jobs_repo, job_ids) for jobs_repo, job_ids in jobs.items() if job_ids]
+            query += " AND (" + (" OR ".join(
+                f"(repo_id = ? AND job_id IN ({', '.join('?' * len(job_ids))}))" for _, job_ids in scoped
+            ) or "0") + ")"
+            for jobs_repo, job_ids in scoped:
+                params.extend([jobs_repo, *job_ids])
+        query += " ORDER BY id"
+        if offset or limit is not None:
+            query += " LIMIT ? OFFSET ?"
+            params.extend([limit if limit is not None else -1, offset])
+
+        with self._lock:
+            rows = self._conn.execute(query, params).fetchall()
+            # Every row up to the table's end has been considered, matching or not
+            cursor = max(cursor, self._conn.execute("SELECT COALESCE(MAX(id), 0) FROM entries").fetchone()[0])
+        return [{**json.loads(entry), 'repo_id': entry_repo} for entry_repo, entry in rows], cursor
@@ -0,0 +1,172 @@
+import math
+import threading
+from bisect import bisect_left, insort
+from typing import Dict, Iterable, List, Optional
+
+from utils.MetricsRecord import to_float
+
+# Ranking name -> (stat, descending)
+RANKINGS = {
+    'best_loss': ('best_loss', False),
+    'hashrate': ('hashrate', True),
+    'submissions': ('submissions', True),
+}
+
+# Stats taken from a miner's most recent submission
+LATEST_STATS = ('last_seen', 'latest_loss', 'hashrate', 'latest_job_id', 'model_repo', 'location')
+
+class MinerStats:
+    """
+    Cross-job statistics of a single miner.
+    """
+
+    __slots__ = ('miner_uid', 'seq', 'best_loss', 'latest_loss', 'hashrate', 'submissions',
+                 'last_seen', 'latest_job_id', 'model_repo', 'location')
+
+    def __init__(self, miner_uid, seq: int):
+        self.miner_uid = miner_uid
+        # Insertion order, used to break ranking ties between uids of mixed types
+        self.seq = seq
+        self.best_loss = math.inf
+        self.latest_loss = math.nan
+        self.hashrate = 0.0
+        self.submissions = 0
+        self.last_seen = -math.inf
+        self.latest_job_id = None
+        self.model_repo = None
+        self.location = 'Unknown'
+
+    def to_dict(self) -> Dict:
+        return {name: getattr(self, name) for name in self.__slots__ if name != 'seq'}
+
+class MinerLeaderboard:
+    """
+    Per-miner index across all jobs with incrementally maintained rankings.
+
+    Each ranking is a sorted list of (key, seq) pairs; a submission only moves
+    its own miner within each list, so top-k queries are a slice and no full
+    sort happens per render.
+    """
+
+    def __init__(self):
+        self.miners: Dict = {}
+        self._rankings: Dict[str, List] = {name: [] for name in RANKINGS}
+        self._by_seq: Dict[int, MinerStats] = {}
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self.miners)
+
+    def __getstate__(self):
+        state = self.__dict__.copy()
+        del state['_lock']
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def _rank_key(stats: MinerStats, ranking: str):
+        stat, descending = RANKINGS[ranking]
+        value = getattr(stats, stat)
+        if math.isnan(value):
+            value = math.inf
+        elif descending:
+            value = -value
+        return (value, stats.seq)
+
+    def update(self, entries: Iterable[Dict], timestamps: Iterable[float]):
+        """
+        Fold ingested entries into the index.
+
+        `timestamps` holds the parsed epoch seconds of each entry, as returned
+        by `MetricsColumns.extend`.
+        """
+        with self._lock:
+            for entry, timestamp in zip(entries, timestamps):
+                miner_uid = entry['miner_uid']
+                stats = self.miners.get(miner_uid)
+                if stats is None:
+                    stats = self.miners[miner_uid] = MinerStats(miner_uid, len(self._by_seq))
+                    self._by_seq[stats.seq] = stats
+                    old_keys = None
+                else:
+                    old_keys = {name: self._rank_key(stats, name) for name in RANKINGS}
+
+                metrics = entry['metrics']
+                loss = to_float(metrics.get('final_loss'))
+                stats.submissions += 1
+                if not math.isnan(loss):
+                    stats.best_loss = min(stats.best_loss, loss)
+                # Entries don't arrive in time order, so "latest" goes by timestamp
+                if stats.submissions == 1 or math.isnan(stats.last_seen) or timestamp >= stats.last_seen:
+                    stats.last_seen = timestamp
+                    stats.latest_loss = loss
+                    stats.hashrate = to_float(metrics.get('hashrate'), 0.0)
+                    stats.latest_job_id = metrics.get('job_id')
+                    stats.model_repo = entry.get('model_repo')
+                    stats.location = entry.get('location', 'Unknown')
+
+                for name, ranking in self._rankings.items():
+                    new_key = self._rank_key(stats, name)
+                    if old_keys is not None:
+                        if old_keys[name] == new_key:
+                            continue
+                        del ranking[bisect_left(ranking, old_keys[name])]
+                    insort(ranking, new_key)
+
+    def top_k(self, k: int, by: str = 'best_loss') -> List[Dict]:
+        """
+        Return the `k` best miners for a ranking as plain dicts.
+        """
+        with self._lock:
+            return [self._by_seq[seq].to_dict() for _, seq in self._rankings[by][:k]]
+
+    def get(self, miner_uid) -> Optional[Dict]:
+        with self._lock:
+            stats = self.miners.get(miner_uid)
+            return stats.to_dict() if stats is not None else None
+
+    def all_stats(self) -> List[Dict]:
+        """
+        Every miner's stats as plain dicts, in first-seen order.
+        """
+        with self._lock:
+            return [stats.to_dict() for stats in self.miners.values()]
+
+def merge_stats(stats: List[Dict]) -> Dict:
+    """
+    Combine one miner's stats from several leaderboards (e.g. one per repository).
+    """
+    merged = dict(stats[0])
+    for other in stats[1:]:
+        # NaN (no valid loss yet) loses to any real loss
+        if math.isnan(merged['best_loss']) or other['best_loss'] < merged['best_loss']:
+            merged['best_loss'] = other['best_loss']
+        merged['submissions'] += other['submissions']
+        if other['last_seen'] > merged['last_seen']:
+            merged.update({name: other[name] for name in LATEST_STATS})
+    return merged
+
+def merged_top_k(leaderboards: Iterable[MinerLeaderboard], k: int, by: str = 'best_loss') -> List[Dict]:
+    """
+    Rank miners across several leaderboards, combining each miner's stats first.
+
+    Costs a pass over every miner, so results should be cached per data version.
+    """
+    by_miner: Dict = {}
+    for leaderboard in leaderboards:
+        for stats in leaderboard.all_stats():
+            by_miner.setdefault(stats['miner_uid'], []).append(stats)
+
+    stat, descending = RANKINGS[by]
+
+    def rank_key(stats: Dict) -> float:
+        value = stats[stat]
+        if math.isnan(value):
+            return math.inf
+        return -value if descending else value
+
+    # sorted is stable, so ties keep first-seen order like MinerLeaderboard
+    return sorted((merge_stats(group) for group in by_miner.values()), key=rank_key)[:k]
@@ -0,0 +1,33 @@
+import threading
+from typing import Optional
+
+class AdaptivePollInterval:
+    """
+    Poll interval that follows the repository's activity.
+
+    It halves (down to `min_interval`) every time a poll finds new commits,
+    doubles (up to `max_interval`) every time the repository was idle, and
+    never goes below a rate-limit delay requested by the Hub.
+    """
+
+    def __init__(self, initial: float = 60, min_interval: float = 10, max_interval: float = 600):
+        self.min_interval = min_interval
+        self.max_interval = max_interval
+        self.interval = min(max(initial, min_interval), max_interval)
+        self._lock = threading.Lock()
+
+    def on_change(self):
+        with self._lock:
+            self.interval = max(self.min_interval, self.interval / 2)
+
+    def on_idle(self):
+        with self._lock:
+            self.interval = min(self.max_interval, self.interval * 2)
+
+    def on_rate_limited(self, retry_after: Optional[float] = None):
+        """
+        Back off after a 429; `retry_after` is the Retry-After delay if the Hub sent one.
+        """
+        with self._lock:
+            backoff = min(self.max_interval, self.interval * 2)
+            self.interval = max(backoff, retry_after or 0)
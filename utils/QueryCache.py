@@ -0,0 +1,44 @@
+import threading
+from collections import OrderedDict
+from typing import Any, Callable, Hashable
+
+class QueryCache:
+    """
+    Bounded LRU cache for query results keyed by data version.
+
+    A result is computed once per (key, version) and then shared by every
+    caller until ingestion bumps the version, so cached values must be treated
+    as read-only. The least recently used results are evicted past `maxsize`.
+    """
+
+    def __init__(self, maxsize: int = 64):
+        self.maxsize = maxsize
+        self.hits = 0
+        self.misses = 0
+        self._entries: OrderedDict = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get_or_compute(self, key: Hashable, version: int, compute: Callable[[], Any]) -> Any:
+        cache_key = (key, version)
+        with self._lock:
+            if cache_key in self._entries:
+                self._entries.move_to_end(cache_key)
+                self.hits += 1
+                return self._entries[cache_key]
+            self.misses += 1
+
+        value = compute()
+
+        with self._lock:
+            self._entries[cache_key] = value
+            self._entries.move_to_end(cache_key)
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+        return value
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def __len__(self):
+        return len(self._entries)
@@ -0,0 +1,33 @@
+from typing import Dict, List
+
+from utils.HFManager import IngestionState
+from utils.JobAggregates import JobAggregates
+from utils.MetricsColumns import MetricsColumns
+from utils.MinerLeaderboard import MinerLeaderboard
+
+class RepoMetrics:
+    """
+    Ingestion state and in-memory indexes of one monitored repository.
+
+    A full refresh swaps in freshly built indexes instead of clearing the
+    current ones, so a query running concurrently keeps a consistent view.
+    """
+
+    def __init__(self, repo_id: str, ingestion_state: IngestionState):
+        self.repo_id = repo_id
+        self.ingestion_state = ingestion_state
+        self.columns = MetricsColumns()
+        self.aggregates = JobAggregates()
+        self.leaderboard = MinerLeaderboard()
+
+    def apply(self, entries: List[Dict], reset: bool):
+        """
+        Fold ingested entries into the indexes, rebuilding them on reset.
+        """
+        columns = MetricsColumns() if reset else self.columns
+        aggregates = JobAggregates() if reset else self.aggregates
+        leaderboard = MinerLeaderboard() if reset else self.leaderboard
+        timestamps = columns.extend(entries)
+        aggregates.update(entries, timestamps)
+        leaderboard.update(entries, timestamps)
+        self.columns, self.aggregates, self.leaderboard = columns, aggregates, leaderboard
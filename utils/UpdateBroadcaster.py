@@ -0,0 +1,98 @@
+import asyncio
+import threading
+from collections import deque
+from typing import Any, List, Optional, Tuple
+
+class Subscription:
+    """
+    One client's bounded queue of pending updates.
+
+    A client that falls more than `maxsize` updates behind doesn't grow the
+    queue: its backlog is dropped and `overflowed` is set, telling the
+    consumer to resynchronize from the store instead.
+    """
+
+    def __init__(self, maxsize: int):
+        self.maxsize = maxsize
+        self.overflowed = False
+        self._queue = deque()
+        self._ready = threading.Condition()
+        self._async_waiters = []
+
+    def put(self, event: Any):
+        with self._ready:
+            if len(self._queue) >= self.maxsize:
+                self._queue.clear()
+                self.overflowed = True
+            else:
+                self._queue.append(event)
+            self._ready.notify_all()
+            for loop, ready in self._async_waiters:
+                loop.call_soon_threadsafe(ready.set)
+
+    def wait(self, timeout: Optional[float] = None) -> bool:
+        """
+        Block until an update is pending; False on timeout.
+        """
+        with self._ready:
+            return self._ready.wait_for(lambda: self._queue or self.overflowed, timeout)
+
+    async def wait_async(self, timeout: Optional[float] = None) -> bool:
+        """
+        `wait` for asyncio consumers, without holding a thread while idle.
+        """
+        loop = asyncio.get_running_loop()
+        ready = asyncio.Event()
+        waiter = (loop, ready)
+        with self._ready:
+            if self._queue or self.overflowed:
+                return True
+            self._async_waiters.append(waiter)
+        try:
+            await asyncio.wait_for(ready.wait(), timeout)
+            return True
+        except asyncio.TimeoutError:
+            return False
+        finally:
+            with self._ready:
+                self._async_waiters.remove(waiter)
+
+    def drain(self) -> Tuple[List, bool]:
+        """
+        Take every pending update, plus whether some were dropped since the last drain.
+        """
+        with self._ready:
+            events, overflowed = list(self._queue), self.overflowed
+            self._queue.clear()
+            self.overflowed = False
+        return events, overflowed
+
+class UpdateBroadcaster:
+    """
+    Fans out updates from a single producer (the ingestion thread) to any
+    number of subscribed clients.
+    """
+
+    def __init__(self, max_queue: int = 16):
+        self.max_queue = max_queue
+        self._subscribers = set()
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._subscribers)
+
+    def subscribe(self) -> Subscription:
+        subscription = Subscription(self.max_queue)
+        with self._lock:
+            self._subscribers.add(subscription)
+        return subscription
+
+    def unsubscribe(self, subscription: Subscription):
+        with self._lock:
+            self._subscribers.discard(subscription)
+
+    def publish(self, event: Any):
+        with self._lock:
+            subscribers = list(self._subscribers)
+        for subscription in subscribers:
+            subscription.put(event)